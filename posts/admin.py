@@ -1,6 +1,7 @@
 from django.contrib import admin
 
 
+from . import search
 from .models import Post, Group, Comment, Follow
 
 
@@ -11,6 +12,11 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ("pub_date",)
     empty_value_display = "-пусто-"
 
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        return search.matching(queryset, search_term), False
+
 
 class GroupAdmin(admin.ModelAdmin):
     
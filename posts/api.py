@@ -0,0 +1,270 @@
+import json
+from functools import wraps
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.http import Http404, HttpResponse, JsonResponse
+from django.shortcuts import get_object_or_404
+
+from . import follows
+from .counters import user_stats
+from .forms import CommentForm
+from .models import Comment, Follow, Group, Post
+from .paginator import MAX_PK, CursorPaginator
+
+
+User = get_user_model()
+
+PER_PAGE = 10
+
+MAX_IDS = 100
+
+MAX_USERNAMES = 500
+
+# Поле ответа -> путь для .values(); ответы собираются из строк без моделей.
+POST_FIELDS = {
+    "id": "id",
+    "text": "text",
+    "pub_date": "pub_date",
+    "author": "author__username",
+    "group": "group__slug",
+    "image": "image",
+    "comment_count": "comment_count",
+}
+
+COMMENT_FIELDS = {
+    "id": "id",
+    "post": "post_id",
+    "author": "author__username",
+    "text": "text",
+    "created": "created",
+}
+
+IMAGE_STORAGE = Post._meta.get_field("image").storage
+
+
+class ApiError(Exception):
+    def __init__(self, status, detail, **extra):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+        self.extra = extra
+
+
+def error(status, detail, **extra):
+    return JsonResponse({"detail": detail, **extra}, status=status)
+
+
+def api_view(*methods):
+    """Проверяет метод и вход и отвечает на ошибки JSON, а не HTML."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                response = error(405, "Метод не поддерживается")
+                response["Allow"] = ", ".join(methods)
+                return response
+            if request.method != "GET" and not request.user.is_authenticated:
+                return error(401, "Нужно войти")
+            try:
+                return view(request, *args, **kwargs)
+            except Http404:
+                return error(404, "Не найдено")
+            except ApiError as exc:
+                return error(exc.status, exc.detail, **exc.extra)
+        return wrapper
+    return decorator
+
+
+def requested_fields(request, available):
+    """Поля из ?fields=a,b; без параметра — все."""
+    raw = request.GET.get("fields")
+    if not raw:
+        return list(available)
+    fields = [name.strip() for name in raw.split(",") if name.strip()]
+    unknown = sorted(set(fields) - set(available))
+    if unknown:
+        raise ApiError(400, f"Неизвестные поля: {', '.join(unknown)}")
+    return fields
+
+
+def values(queryset, fields, available, *always):
+    paths = {available[name] for name in fields}
+    return queryset.values(*paths.union(always))
+
+
+def serialize(rows, fields, available):
+    result = []
+    for row in rows:
+        item = {name: row[available[name]] for name in fields}
+        if "image" in item:
+            image = item["image"]
+            item["image"] = IMAGE_STORAGE.url(image) if image else None
+        result.append(item)
+    return result
+
+
+def link(request, name, cursor):
+    if cursor is None:
+        return None
+    query = request.GET.copy()
+    query.pop("after", None)
+    query.pop("before", None)
+    query[name] = cursor
+    return f"{request.path}?{query.urlencode()}"
+
+
+def cursor_list(request, paginator, fields, available):
+    page = paginator.get_page(
+        after=request.GET.get("after"), before=request.GET.get("before")
+    )
+    return JsonResponse({
+        "results": serialize(page, fields, available),
+        "next": link(request, "after", page.next_cursor),
+        "previous": link(request, "before", page.previous_cursor),
+    })
+
+
+def parse_ids(raw):
+    try:
+        ids = [int(pk) for pk in raw.split(",") if pk.strip()]
+    except ValueError:
+        raise ApiError(400, "ids — это список чисел через запятую")
+    if len(ids) > MAX_IDS:
+        raise ApiError(400, f"Не больше {MAX_IDS} id за запрос")
+    if not all(0 < pk <= MAX_PK for pk in ids):
+        raise ApiError(400, f"id должны быть от 1 до {MAX_PK}")
+    return ids
+
+
+def post_list(request, queryset):
+    """Лента постов по курсору или пачка постов по ?ids=1,2,3."""
+    fields = requested_fields(request, POST_FIELDS)
+    if "ids" in request.GET:
+        ids = parse_ids(request.GET["ids"])
+        rows = values(queryset.filter(pk__in=ids), fields, POST_FIELDS, "id")
+        found = {row["id"]: row for row in rows}
+        rows = [found[pk] for pk in ids if pk in found]
+        return JsonResponse({"results": serialize(rows, fields, POST_FIELDS)})
+    rows = values(queryset, fields, POST_FIELDS, "id", "pub_date")
+    paginator = CursorPaginator(rows, PER_PAGE)
+    return cursor_list(request, paginator, fields, POST_FIELDS)
+
+
+def request_data(request):
+    if request.content_type != "application/json":
+        return request.POST
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        raise ApiError(400, "Неверный JSON")
+    if not isinstance(data, dict):
+        raise ApiError(400, "Ожидается JSON-объект")
+    return data
+
+
+@api_view("GET")
+def index(request):
+    return post_list(request, Post.objects.all())
+
+
+@api_view("GET")
+def group_posts(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return post_list(request, Post.objects.filter(group=group))
+
+
+@api_view("GET")
+def profile(request, username):
+    author = get_object_or_404(User, username=username)
+    stats = user_stats(author)
+    data = {
+        "username": author.username,
+        "posts_count": stats.posts_count,
+        "followers_count": stats.followers_count,
+        "following_count": stats.following_count,
+    }
+    if request.user.is_authenticated:
+        data["following"] = Follow.objects.filter(
+            user=request.user, author=author
+        ).exists()
+    return JsonResponse(data)
+
+
+@api_view("GET")
+def profile_posts(request, username):
+    author = get_object_or_404(User, username=username)
+    return post_list(request, author.posts.all())
+
+
+@api_view("GET")
+def post_detail(request, post_id):
+    fields = requested_fields(request, POST_FIELDS)
+    row = values(Post.objects.filter(pk=post_id), fields, POST_FIELDS).first()
+    if row is None:
+        raise Http404
+    return JsonResponse(serialize([row], fields, POST_FIELDS)[0])
+
+
+@api_view("GET", "POST")
+def comments(request, post_id):
+    post = get_object_or_404(Post.objects.only("id"), pk=post_id)
+    fields = requested_fields(request, COMMENT_FIELDS)
+    if request.method == "POST":
+        form = CommentForm(request_data(request))
+        if not form.is_valid():
+            raise ApiError(400, "Неверные данные", errors=form.errors)
+        with transaction.atomic():
+            comment = form.save(commit=False)
+            comment.post = post
+            comment.author = request.user
+            comment.save()
+        row = values(
+            Comment.objects.filter(pk=comment.pk), fields, COMMENT_FIELDS
+        ).get()
+        return JsonResponse(
+            serialize([row], fields, COMMENT_FIELDS)[0], status=201
+        )
+    rows = values(post.comments.all(), fields, COMMENT_FIELDS, "id", "created")
+    paginator = CursorPaginator(
+        rows, PER_PAGE, key=("created", "id"), descending=False
+    )
+    return cursor_list(request, paginator, fields, COMMENT_FIELDS)
+
+
+@api_view("POST", "DELETE")
+def follow(request, username):
+    author = get_object_or_404(User, username=username)
+    if request.method == "DELETE":
+        with transaction.atomic():
+            Follow.objects.filter(user=request.user, author=author).delete()
+        return HttpResponse(status=204)
+    if author == request.user:
+        raise ApiError(400, "Нельзя подписаться на себя")
+    with transaction.atomic():
+        _, created = Follow.objects.get_or_create(
+            user=request.user, author=author
+        )
+    return JsonResponse({"following": True}, status=201 if created else 200)
+
+
+@api_view("POST", "DELETE")
+def bulk_follow(request):
+    """Подписка (POST) или отписка (DELETE) по {"usernames": [...]}."""
+    usernames = request_data(request).get("usernames")
+    if not isinstance(usernames, list) or not all(
+        isinstance(name, str) for name in usernames
+    ):
+        raise ApiError(400, "usernames — это список имён пользователей")
+    if len(usernames) > MAX_USERNAMES:
+        raise ApiError(400, f"Не больше {MAX_USERNAMES} имён за запрос")
+    if request.method == "POST":
+        results = follows.follow_many(request.user, usernames)
+    else:
+        results = follows.unfollow_many(request.user, usernames)
+    return JsonResponse({
+        "results": [
+            {"username": username, "status": status}
+            for username, status in results
+        ]
+    })
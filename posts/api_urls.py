@@ -0,0 +1,27 @@
+from django.urls import path
+
+from . import api
+
+
+urlpatterns = [
+    path("posts/", api.index, name="api_index"),
+    path("posts/<int:post_id>/", api.post_detail, name="api_post"),
+    path(
+        "posts/<int:post_id>/comments/",
+        api.comments,
+        name="api_comments"
+    ),
+    path(
+        "groups/<slug:slug>/posts/",
+        api.group_posts,
+        name="api_group_posts"
+    ),
+    path("users/<str:username>/", api.profile, name="api_profile"),
+    path(
+        "users/<str:username>/posts/",
+        api.profile_posts,
+        name="api_profile_posts"
+    ),
+    path("users/<str:username>/follow/", api.follow, name="api_follow"),
+    path("follows/", api.bulk_follow, name="api_bulk_follow"),
+]
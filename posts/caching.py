@@ -0,0 +1,60 @@
+import math
+import random
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import page_cache
+
+
+def get_or_set(key, compute, timeout, beta=1.0, lock_timeout=10, poll=0.05):
+    """cache.get_or_set с защитой от одновременного пересчёта.
+
+    Значение хранится вместе со временем вычисления и сроком жизни и
+    пересчитывается заранее с вероятностью, растущей к концу срока
+    (probabilistic early expiration). Пересчитывает только тот, кто взял
+    блокировку через cache.add, остальные отдают старое значение или ждут
+    нового. На FileBasedCache add не атомарен, и блокировка лишь снижает
+    число одновременных пересчётов.
+
+    Блокировка хранит метку взявшего её вызова: если пересчёт дольше
+    lock_timeout и блокировку уже взял другой, она не снимается.
+    """
+    entry = cache.get(key)
+    now = time.time()
+    if entry is not None:
+        value, delta, expiry = entry
+        if now - delta * beta * math.log(1 - random.random()) < expiry:
+            return value
+
+    lock_key = f"{key}:lock"
+    token = uuid.uuid4().hex
+    if cache.add(lock_key, token, lock_timeout):
+        try:
+            started = time.time()
+            value = compute()
+            finished = time.time()
+            entry = (value, finished - started, finished + timeout)
+            cache.set(key, entry, timeout)
+            return value
+        finally:
+            if cache.get(lock_key) == token:
+                cache.delete(lock_key)
+
+    if entry is not None:
+        return entry[0]
+    deadline = now + lock_timeout
+    while time.time() < deadline:
+        time.sleep(poll)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry[0]
+    return compute()
+
+
+def cached_count(feed, queryset):
+    """Число постов ленты; ключ меняется вместе с поколением кеша ленты."""
+    key = f"feed_count:{feed}:{page_cache.generation(feed)}"
+    return get_or_set(key, queryset.count, settings.FEED_COUNT_TIMEOUT)
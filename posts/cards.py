@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+
+from .models import Post
+
+
+def card_key(post, user):
+    owner = int(user is not None and user.pk == post.author_id)
+    return f"post_card:{post.pk}:{post.version}:{owner}"
+
+
+def bump(**filters):
+    Post.objects.filter(**filters).update(version=F("version") + 1)
+
+
+def render_cards(posts, render, user, prepare=None):
+    """Возвращает HTML карточек, забирая готовые из кеша одним get_many.
+
+    prepare получает список постов, карточки которых придётся отрисовать.
+    """
+    keys = [card_key(post, user) for post in posts]
+    cached = cache.get_many(keys)
+    stale = [(key, post) for key, post in zip(keys, posts) if key not in cached]
+    if prepare is not None and stale:
+        prepare([post for key, post in stale])
+    missing = {}
+    for key, post in stale:
+        missing[key] = cached[key] = render(post)
+    if missing:
+        cache.set_many(missing, settings.POST_CARD_CACHE_TIMEOUT)
+    return [cached[key] for key in keys]
@@ -0,0 +1,143 @@
+import logging
+import queue
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import connections, transaction
+
+from . import counters, page_cache
+from .models import Comment, Post
+from .thumbnails import shares_memory_db
+
+
+logger = logging.getLogger(__name__)
+
+DIRECT = "direct"
+DURABLE = "durable"
+BUFFERED = "buffered"
+
+_queue = queue.Queue()
+_writer = None
+_writer_lock = threading.Lock()
+
+
+class CommentWriteError(Exception):
+    pass
+
+
+class PendingComment:
+    def __init__(self, post_id, author_id, text):
+        self.comment = Comment(post_id=post_id, author_id=author_id, text=text)
+        self.done = threading.Event()
+        self.error = None
+
+
+def write_many(comments):
+    """Вставляет комментарии одним bulk_create в одной транзакции.
+
+    bulk_create не шлёт post_save, поэтому счётчики и кеш лент
+    обновляются здесь, по одному UPDATE на каждый пост пачки.
+    """
+    with transaction.atomic():
+        Comment.objects.bulk_create(comments)
+        per_post = Counter(comment.post_id for comment in comments)
+        for post_id, count in per_post.items():
+            counters.adjust_post(post_id, count)
+        page_cache.invalidate_posts(Post.objects.filter(pk__in=per_post))
+
+
+def collect_batch():
+    """Первый комментарий из очереди и всё, что придёт за окно пакета."""
+    batch = [_queue.get()]
+    deadline = time.monotonic() + settings.COMMENT_BATCH_WINDOW
+    while len(batch) < settings.COMMENT_BATCH_SIZE:
+        timeout = deadline - time.monotonic()
+        if timeout <= 0:
+            break
+        try:
+            batch.append(_queue.get(timeout=timeout))
+        except queue.Empty:
+            break
+    return batch
+
+
+def _write(batch):
+    try:
+        write_many([pending.comment for pending in batch])
+    except Exception as exc:
+        if len(batch) == 1:
+            logger.exception("Не удалось записать комментарий")
+            batch[0].error = exc
+            return
+        # Например, пост одного комментария успели удалить: остальные
+        # комментарии пакета не должны пропасть вместе с ним.
+        logger.warning(
+            "Пакет из %s комментариев не записан, пишем по одному", len(batch)
+        )
+        for pending in batch:
+            _write([pending])
+
+
+def _write_batch(batch):
+    try:
+        _write(batch)
+    finally:
+        for pending in batch:
+            pending.done.set()
+
+
+def _write_forever():
+    while True:
+        batch = collect_batch()
+        try:
+            _write_batch(batch)
+        finally:
+            # Соединения потока-писателя не закрываются обработчиком запроса.
+            connections.close_all()
+
+
+def writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None or not _writer.is_alive():
+            _writer = threading.Thread(
+                target=_write_forever, name="comment-writer", daemon=True
+            )
+            _writer.start()
+    return _writer
+
+
+def flush():
+    """Записывает очередь в текущем потоке; для тестов и остановки процесса."""
+    batch = []
+    while True:
+        try:
+            batch.append(_queue.get_nowait())
+        except queue.Empty:
+            break
+    if batch:
+        _write_batch(batch)
+
+
+def add(post_id, author_id, text):
+    """Сохраняет комментарий согласно COMMENT_WRITE_MODE.
+
+    direct — INSERT в потоке запроса; durable — комментарий уходит в
+    пакет фонового писателя, а ответ ждёт фиксации пакета; buffered —
+    ответ не ждёт записи, и при падении процесса очередь теряется.
+    """
+    mode = settings.COMMENT_WRITE_MODE
+    if mode == DIRECT or shares_memory_db():
+        write_many([Comment(post_id=post_id, author_id=author_id, text=text)])
+        return
+    pending = PendingComment(post_id, author_id, text)
+    writer()
+    _queue.put(pending)
+    if mode == BUFFERED:
+        return
+    if not pending.done.wait(settings.COMMENT_WRITE_TIMEOUT):
+        raise CommentWriteError("Комментарий не записан вовремя")
+    if pending.error is not None:
+        raise CommentWriteError("Комментарий не записан") from pending.error
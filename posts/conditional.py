@@ -0,0 +1,50 @@
+import hashlib
+from datetime import datetime, timezone
+
+from django.views.decorators.http import condition
+
+from . import page_cache
+from .models import Post
+
+
+def _etag(request, *stamp):
+    # Страница зависит от вошедшего пользователя и номера страницы ленты.
+    parts = (*stamp, request.user.pk, request.get_full_path())
+    return hashlib.md5(":".join(map(str, parts)).encode()).hexdigest()
+
+
+def feed_condition(feed_name):
+    """ETag и Last-Modified ленты по поколению её кеша, без запросов к базе.
+
+    Поколение меняется при любом изменении ленты и хранит время этого
+    изменения. Last-Modified отдаётся только анонимам: для вошедших
+    пользователей страница различается, и это учитывает лишь ETag.
+    """
+    def etag(request, *args, **kwargs):
+        feed = feed_name(*args, **kwargs)
+        return _etag(request, feed, page_cache.generation(feed))
+
+    def last_modified(request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return None
+        stamp = page_cache.generation(feed_name(*args, **kwargs))
+        return datetime.fromtimestamp(stamp / 1000, timezone.utc)
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
+
+
+def post_etag(request, username, post_id):
+    """Версия поста растёт при правке, комментариях и смене миниатюр."""
+    stamp = (
+        Post.objects.filter(pk=post_id, author__username=username)
+        .values_list(
+            "version",
+            "author__stats__posts_count",
+            "author__stats__followers_count",
+            "author__stats__following_count",
+        )
+        .first()
+    )
+    if stamp is None:
+        return None
+    return _etag(request, *stamp)
@@ -0,0 +1,94 @@
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Post, Comment, Follow, UserStats
+
+
+def count_of(queryset, field, ref="pk"):
+    """Коррелированный подзапрос COUNT(*) строк, где `field` = `ref` внешней строки."""
+    counted = (
+        queryset.filter(**{field: OuterRef(ref)})
+        .order_by()
+        .values(field)
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+    return Coalesce(Subquery(counted, output_field=IntegerField()), 0)
+
+
+def actual_post_counts():
+    return {"comment_count": count_of(Comment.objects.all(), "post")}
+
+
+def actual_user_counts(ref="pk"):
+    return {
+        "followers_count": count_of(Follow.objects.all(), "author", ref),
+        "following_count": count_of(Follow.objects.all(), "user", ref),
+        "posts_count": count_of(Post.objects.all(), "author", ref),
+    }
+
+
+def recount_user(user_id):
+    values = {
+        "followers_count": Follow.objects.filter(author_id=user_id).count(),
+        "following_count": Follow.objects.filter(user_id=user_id).count(),
+        "posts_count": Post.objects.filter(author_id=user_id).count(),
+    }
+    stats, _ = UserStats.objects.update_or_create(
+        user_id=user_id, defaults=values
+    )
+    return stats
+
+
+def user_stats(user):
+    try:
+        return UserStats.objects.get(user=user)
+    except UserStats.DoesNotExist:
+        return recount_user(user.pk)
+
+
+def adjust_user(user_id, **deltas):
+    if user_id is None:
+        return
+    updates = {
+        name: Greatest(F(name) + delta, 0) for name, delta in deltas.items()
+    }
+    updated = UserStats.objects.filter(user_id=user_id).update(**updates)
+    if not updated and all(delta > 0 for delta in deltas.values()):
+        # Строки ещё нет: считаем заново, новая запись уже видна в транзакции.
+        recount_user(user_id)
+
+
+def adjust_users(user_ids, **deltas):
+    """adjust_user для многих пользователей одним UPDATE."""
+    user_ids = set(user_ids)
+    updates = {
+        name: Greatest(F(name) + delta, 0) for name, delta in deltas.items()
+    }
+    UserStats.objects.filter(user_id__in=user_ids).update(**updates)
+    if all(delta > 0 for delta in deltas.values()):
+        existing = UserStats.objects.filter(user_id__in=user_ids).values_list(
+            "user_id", flat=True
+        )
+        for user_id in user_ids - set(existing):
+            recount_user(user_id)
+
+
+def recount_users(user_ids):
+    """Пересчитывает счётчики пользователей по таблицам одним UPDATE."""
+    user_ids = set(user_ids)
+    UserStats.objects.filter(user_id__in=user_ids).update(
+        **actual_user_counts("user")
+    )
+    existing = UserStats.objects.filter(user_id__in=user_ids).values_list(
+        "user_id", flat=True
+    )
+    for user_id in user_ids - set(existing):
+        recount_user(user_id)
+
+
+def adjust_post(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        comment_count=Greatest(F("comment_count") + delta, 0),
+        version=F("version") + 1,
+    )
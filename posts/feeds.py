@@ -0,0 +1,187 @@
+import json
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.http import Http404, HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.feedgenerator import Atom1Feed
+from django.utils.text import Truncator
+
+from . import page_cache
+from .conditional import feed_condition
+from .models import Group, Post
+from .replicas import replica_reads
+
+
+User = get_user_model()
+
+FEED_LENGTH = 20
+
+CONTENT_TYPES = {
+    "atom": "application/atom+xml; charset=utf-8",
+    "json": "application/feed+json; charset=utf-8",
+}
+
+
+def title_of(post):
+    first_line = post.text.strip().split("\n", 1)[0]
+    return Truncator(first_line).chars(80) or f"Запись {post.pk}"
+
+
+def post_url(request, post):
+    return request.build_absolute_uri(
+        reverse("post", args=[post.author.username, post.pk])
+    )
+
+
+def atom_entry(request, post):
+    feed = Atom1Feed(title="", link="", description="")
+    feed.add_item(
+        title=title_of(post),
+        link=post_url(request, post),
+        description=post.text,
+        unique_id=post_url(request, post),
+        pubdate=post.pub_date,
+        author_name=post.author.username,
+        categories=[post.group.title] if post.group else None,
+    )
+    xml = feed.writeString("utf-8")
+    return xml[xml.index("<entry>"):xml.rindex("</entry>") + len("</entry>")]
+
+
+def json_entry(request, post):
+    item = {
+        "id": post_url(request, post),
+        "url": post_url(request, post),
+        "title": title_of(post),
+        "content_text": post.text,
+        "date_published": post.pub_date.isoformat(),
+        "authors": [{
+            "name": post.author.username,
+            "url": request.build_absolute_uri(
+                reverse("profile", args=[post.author.username])
+            ),
+        }],
+    }
+    if post.group:
+        item["tags"] = [post.group.title]
+    if post.image:
+        item["image"] = request.build_absolute_uri(post.image.url)
+    return json.dumps(item, ensure_ascii=False)
+
+
+def atom_document(request, title, link, entries):
+    feed = Atom1Feed(
+        title=title,
+        link=request.build_absolute_uri(link),
+        description="",
+        feed_url=request.build_absolute_uri(),
+    )
+    xml = feed.writeString("utf-8")
+    closing = xml.rindex("</feed>")
+    return xml[:closing] + "".join(entries) + xml[closing:]
+
+
+def json_document(request, title, link, entries):
+    head = json.dumps({
+        "version": "https://jsonfeed.org/version/1.1",
+        "title": title,
+        "home_page_url": request.build_absolute_uri(link),
+        "feed_url": request.build_absolute_uri(),
+    }, ensure_ascii=False)
+    return f'{head[:-1]}, "items": [{", ".join(entries)}]}}'
+
+
+BUILDERS = {
+    "atom": (atom_entry, atom_document),
+    "json": (json_entry, json_document),
+}
+
+
+def entries(request, fmt, posts):
+    """Записи ленты; готовые берутся из кеша по версии поста."""
+    render_entry = BUILDERS[fmt][0]
+    host = request.get_host()
+    keys = [f"feed_entry:{fmt}:{host}:{post.pk}:{post.version}" for post in posts]
+    cached = cache.get_many(keys)
+    missing = {}
+    for key, post in zip(keys, posts):
+        if key not in cached:
+            missing[key] = cached[key] = render_entry(request, post)
+    if missing:
+        cache.set_many(missing, settings.POST_CARD_CACHE_TIMEOUT)
+    return [cached[key] for key in keys]
+
+
+def render_feed(request, fmt, feed, describe):
+    """Документ ленты кешируется до следующего изменения ленты.
+
+    После нового поста документ собирается заново, но из записей
+    заново строится только запись этого поста. describe() возвращает
+    заголовок, адрес HTML-страницы и queryset постов.
+    """
+    if fmt not in BUILDERS:
+        raise Http404
+    key = (
+        f"syndication:{fmt}:{feed}:{page_cache.generation(feed)}:"
+        f"{request.get_host()}"
+    )
+    content = cache.get(key)
+    if content is None:
+        title, link, posts = describe()
+        posts = list(
+            posts.for_feed().order_by("-pub_date", "-id")[:FEED_LENGTH]
+        )
+        content = BUILDERS[fmt][1](
+            request, title, link, entries(request, fmt, posts)
+        )
+        cache.set(key, content, settings.PAGE_CACHE_TIMEOUT)
+    return HttpResponse(content, content_type=CONTENT_TYPES[fmt])
+
+
+def site_feed_name(fmt):
+    return page_cache.index_feed()
+
+
+def group_feed_name(slug, fmt):
+    return page_cache.group_feed(slug)
+
+
+def author_feed_name(username, fmt):
+    return page_cache.profile_feed(username)
+
+
+@replica_reads(site_feed_name)
+@feed_condition(site_feed_name)
+def site_feed(request, fmt):
+    def describe():
+        return "Yatube", reverse("index"), Post.objects.all()
+    return render_feed(request, fmt, site_feed_name(fmt), describe)
+
+
+@replica_reads(group_feed_name)
+@feed_condition(group_feed_name)
+def group_feed(request, slug, fmt):
+    def describe():
+        group = get_object_or_404(Group, slug=slug)
+        return (
+            f"Yatube: {group.title}",
+            reverse("group_posts", args=[slug]),
+            Post.objects.filter(group=group),
+        )
+    return render_feed(request, fmt, group_feed_name(slug, fmt), describe)
+
+
+@replica_reads(author_feed_name)
+@feed_condition(author_feed_name)
+def author_feed(request, username, fmt):
+    def describe():
+        author = get_object_or_404(User, username=username)
+        return (
+            f"Yatube: @{author.username}",
+            reverse("profile", args=[username]),
+            Post.objects.filter(author=author),
+        )
+    return render_feed(request, fmt, author_feed_name(username, fmt), describe)
@@ -0,0 +1,145 @@
+from django.contrib.auth import get_user_model
+from django.db import connections, router, transaction
+
+from . import counters, page_cache, timeline
+from .models import Follow
+
+
+User = get_user_model()
+
+FOLLOWED = "followed"
+UNFOLLOWED = "unfollowed"
+ALREADY_FOLLOWING = "already_following"
+NOT_FOLLOWING = "not_following"
+NOT_FOUND = "not_found"
+SELF = "self"
+
+
+def _resolve(usernames):
+    """Имена без повторов в исходном порядке и их id одним запросом."""
+    usernames = list(dict.fromkeys(usernames))
+    ids = dict(
+        User.objects.filter(username__in=usernames).values_list("username", "pk")
+    )
+    return usernames, ids
+
+
+def _batches(connection, author_ids):
+    """Части author_ids, которые укладываются в лимит параметров запроса."""
+    size = connection.ops.bulk_batch_size(["user_id", "author_id"], author_ids)
+    for start in range(0, len(author_ids), size):
+        yield author_ids[start:start + size]
+
+
+def insert_follows(user_id, author_ids):
+    """INSERT, пропускающий уже существующие пары; число вставленных строк.
+
+    bulk_create(ignore_conflicts=True) не сообщает, сколько строк вставлено.
+    """
+    connection = connections[router.db_for_write(Follow)]
+    table = connection.ops.quote_name(Follow._meta.db_table)
+    inserted = 0
+    with connection.cursor() as cursor:
+        for batch in _batches(connection, author_ids):
+            values = ", ".join(["(%s, %s)"] * len(batch))
+            sql = (
+                f"{connection.ops.insert_statement(ignore_conflicts=True)} "
+                f"{table} (user_id, author_id) VALUES {values} "
+                f"{connection.ops.ignore_conflicts_suffix_sql(ignore_conflicts=True)}"
+            )
+            params = [
+                value for author_id in batch for value in (user_id, author_id)
+            ]
+            cursor.execute(sql, params)
+            inserted += cursor.rowcount
+    return inserted
+
+
+def delete_follows(user_id, author_ids):
+    """DELETE подписок user_id на author_ids без сигналов; число удалённых."""
+    connection = connections[router.db_for_write(Follow)]
+    table = connection.ops.quote_name(Follow._meta.db_table)
+    deleted = 0
+    with connection.cursor() as cursor:
+        for batch in _batches(connection, author_ids):
+            placeholders = ", ".join(["%s"] * len(batch))
+            cursor.execute(
+                f"DELETE FROM {table} "
+                f"WHERE user_id = %s AND author_id IN ({placeholders})",
+                [user_id, *batch],
+            )
+            deleted += cursor.rowcount
+    return deleted
+
+
+@transaction.atomic
+def follow_many(user, usernames):
+    """Подписывает user на авторов по списку имён.
+
+    Подписки вставляются пачками INSERT без сигналов post_save: счётчики,
+    ленты и кеш страниц обновляются здесь пачкой.
+    Возвращает список пар (имя, статус).
+    """
+    usernames, ids = _resolve(usernames)
+    existing = set(
+        Follow.objects.filter(user=user, author_id__in=ids.values()).values_list(
+            "author_id", flat=True
+        )
+    )
+    results, new_ids = [], []
+    for username in usernames:
+        author_id = ids.get(username)
+        if author_id is None:
+            status = NOT_FOUND
+        elif author_id == user.pk:
+            status = SELF
+        elif author_id in existing:
+            status = ALREADY_FOLLOWING
+        else:
+            status = FOLLOWED
+            new_ids.append(author_id)
+        results.append((username, status))
+    if not new_ids:
+        return results
+
+    if insert_follows(user.pk, new_ids) == len(new_ids):
+        counters.adjust_user(user.pk, following_count=len(new_ids))
+        counters.adjust_users(new_ids, followers_count=1)
+    else:
+        # Часть подписок успел вставить одновременный запрос, и его сигналы
+        # уже поправили счётчики: пересчитываем их по таблице подписок.
+        counters.recount_users([user.pk, *new_ids])
+    timeline.backfill_many(user.pk, new_ids)
+    page_cache.invalidate_profiles([user.pk, *new_ids])
+    return results
+
+
+@transaction.atomic
+def unfollow_many(user, usernames):
+    """Отписывает user от авторов по списку имён; пары (имя, статус)."""
+    usernames, ids = _resolve(usernames)
+    follows = Follow.objects.filter(user=user, author_id__in=ids.values())
+    followed = set(follows.values_list("author_id", flat=True))
+    if followed:
+        # Удаляем пачками DELETE без post_delete на каждую подписку, а
+        # счётчики, ленту и кеш страниц обновляем здесь пачкой.
+        deleted = delete_follows(user.pk, list(followed))
+        if deleted == len(followed):
+            counters.adjust_user(user.pk, following_count=-deleted)
+            counters.adjust_users(followed, followers_count=-1)
+        else:
+            # Часть подписок уже удалил одновременный запрос.
+            counters.recount_users([user.pk, *followed])
+        timeline.remove_many(user.pk, followed)
+        page_cache.invalidate_profiles([user.pk, *followed])
+    results = []
+    for username in usernames:
+        author_id = ids.get(username)
+        if author_id is None:
+            status = NOT_FOUND
+        elif author_id in followed:
+            status = UNFOLLOWED
+        else:
+            status = NOT_FOLLOWING
+        results.append((username, status))
+    return results
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.precompile import is_cached, precompile
+
+
+class Command(BaseCommand):
+    help = (
+        "Разбирает все шаблоны проекта и приложений и завершается с ошибкой, "
+        "если какой-то из них не разбирается"
+    )
+
+    def handle(self, *args, **options):
+        count, errors = precompile()
+        for name, error in errors:
+            self.stderr.write(f"{name}: {error}")
+        if errors:
+            raise CommandError(f"Не разбираются шаблоны: {len(errors)} из {count}")
+        loader = "кеширующий загрузчик" if is_cached() else "без кеша (DEBUG)"
+        self.stdout.write(f"Шаблонов: {count}, {loader}")
@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from yatube import connections
+
+
+class Command(BaseCommand):
+    help = (
+        "Показывает, сколько соединений с базой открыто и переиспользовано "
+        "и сколько времени уходит на получение нового соединения"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset", action="store_true", help="Обнулить счётчики"
+        )
+
+    def handle(self, *args, **options):
+        for alias in settings.DATABASES:
+            if options["reset"]:
+                connections.reset(alias)
+                continue
+            stats = connections.stats(alias)
+            opened = stats["opened"]
+            average = stats["acquire_us"] / opened / 1000 if opened else 0
+            self.stdout.write(
+                f"{alias}:\n"
+                f"  Открыто: {opened}\n"
+                f"  Переиспользовано: {stats['reused']}\n"
+                f"  Не прошли проверку: {stats['health_check_failures']}\n"
+                f"  Среднее время получения: {average:.2f} мс"
+            )
+            for name in connections.bucket_names():
+                self.stdout.write(f"  {name}: {stats[name]}")
@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from posts.models import Post, Comment, Follow
+from posts.paginator import CursorPaginator
+from posts.timeline import Timeline
+
+
+def feed_queries(user_id=1, author_id=1, group_id=1, post_id=1):
+    """Запросы, которые выполняют представления posts.views."""
+    now = timezone.now()
+    feeds = {
+        "index": Post.objects.for_feed(),
+        "group_posts": Post.objects.for_feed().filter(group_id=group_id),
+        "profile": Post.objects.for_feed().filter(author_id=author_id),
+    }
+    queries = {}
+    for name, queryset in feeds.items():
+        paginator = CursorPaginator(queryset, 10)
+        queries[name] = paginator.queryset[:11]
+        queries[f"{name} ?after="] = paginator.after(now, post_id)[:11]
+        queries[f"{name} ?before="] = paginator.before(now, post_id)[:11]
+    timeline = Timeline(user_id)
+    queries["follow_index entries"] = timeline.entries(11)
+    queries["follow_index entries ?after="] = Timeline(
+        user_id, after=(now, post_id)
+    ).entries(11)
+    queries["follow_index pulled"] = timeline.pulled(11, [author_id])
+    comments = CursorPaginator(
+        Comment.objects.filter(post_id=post_id),
+        50,
+        key=("created", "id"),
+        descending=False,
+    )
+    queries["post_view comments"] = comments.queryset[:51]
+    queries["post_view comments ?after="] = comments.after(now, post_id)[:51]
+    queries["profile follow"] = Follow.objects.filter(
+        user_id=user_id, author_id=author_id
+    )
+    queries["followers"] = Follow.objects.filter(
+        author_id=author_id
+    ).values("user")
+    return queries
+
+
+class Command(BaseCommand):
+    help = "Показывает планы запросов (EXPLAIN QUERY PLAN) для лент posts.views"
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("Команда рассчитана на SQLite")
+        for name, queryset in feed_queries().items():
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(queryset.explain())
+            self.stdout.write("")
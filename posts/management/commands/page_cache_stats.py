@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from posts import page_cache
+
+
+class Command(BaseCommand):
+    help = "Показывает попадания и промахи кеша страниц лент"
+
+    def handle(self, *args, **options):
+        stats = page_cache.stats()
+        total = stats["hits"] + stats["misses"]
+        ratio = stats["hits"] / total if total else 0
+        self.stdout.write(
+            f"Попаданий: {stats['hits']}\n"
+            f"Промахов: {stats['misses']}\n"
+            f"Доля попаданий: {ratio:.1%}"
+        )
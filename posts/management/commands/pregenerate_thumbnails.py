@@ -0,0 +1,116 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from posts import page_cache, thumbnails
+from posts.models import Post
+
+
+def batches(queryset, after_id, size):
+    # Пачки по ключу, а не iterator(): соединение закрывается перед fork.
+    while True:
+        batch = list(queryset.filter(pk__gt=after_id)[:size])
+        if not batch:
+            return
+        yield batch
+        after_id = batch[-1][0]
+
+
+class Command(BaseCommand):
+    help = (
+        "Готовит миниатюры картинок постов, у которых их ещё нет, "
+        "в пуле процессов"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Число процессов; 0 — готовить в текущем процессе",
+        )
+        parser.add_argument(
+            "--rate",
+            type=float,
+            default=0,
+            help="Не больше стольких постов в секунду; 0 — без ограничения",
+        )
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument(
+            "--after-id",
+            type=int,
+            default=0,
+            help="Продолжить с поста, следующего за этим id",
+        )
+
+    def handle(self, *args, **options):
+        posts = (
+            Post.objects.exclude(image="")
+            .order_by("pk")
+            .values_list("pk", "image", "thumbnails")
+        )
+        self.interval = 1 / options["rate"] if options["rate"] > 0 else 0
+        self.next_at = time.monotonic()
+        workers = options["workers"]
+        if thumbnails.shares_memory_db():
+            workers = 0
+        pool = ProcessPoolExecutor(workers) if workers > 0 else None
+        totals = {"ready": 0, "done": 0, "failed": 0}
+        try:
+            for batch in batches(
+                posts, options["after_id"], options["batch_size"]
+            ):
+                pending = [
+                    (pk, image) for pk, image, names in batch
+                    if not thumbnails.is_ready(thumbnails.stored_names(names))
+                ]
+                totals["ready"] += len(batch) - len(pending)
+                if pending:
+                    done = self.generate(pool, pending)
+                    self.publish(done)
+                    totals["done"] += len(done)
+                    totals["failed"] += len(pending) - len(done)
+                self.stdout.write(f"Обработаны посты до id {batch[-1][0]}")
+        finally:
+            if pool is not None:
+                pool.shutdown()
+        self.stdout.write(self.style.SUCCESS(
+            f"Уже готовы: {totals['ready']}, подготовлено: {totals['done']}, "
+            f"с ошибками: {totals['failed']}"
+        ))
+
+    def paced(self, items):
+        for item in items:
+            if self.interval:
+                delay = self.next_at - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                self.next_at = max(self.next_at, time.monotonic()) + self.interval
+            yield item
+
+    def generate(self, pool, pending):
+        if pool is None:
+            results = [
+                thumbnails.pregenerate(*item) for item in self.paced(pending)
+            ]
+        else:
+            # Процессы пула наследуют соединения при fork: закрываем их заранее.
+            connections.close_all()
+            futures = [
+                pool.submit(thumbnails.pregenerate, *item)
+                for item in self.paced(pending)
+            ]
+            results = [future.result() for future in futures]
+        return [result for result in results if result is not None]
+
+    def publish(self, done):
+        if not done:
+            return
+        for post_id, source_name, names in done:
+            thumbnails.store(post_id, source_name, names)
+        page_cache.invalidate_posts(
+            Post.objects.filter(pk__in=[post_id for post_id, *_ in done])
+        )
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = "Перестраивает полнотекстовый индекс постов"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if not search.is_supported():
+            raise CommandError("Полнотекстовый индекс поддерживается только в SQLite")
+        indexed = search.rebuild(options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Проиндексировано постов: {indexed}"))
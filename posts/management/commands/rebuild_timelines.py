@@ -0,0 +1,22 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from posts import timeline
+
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Пересобирает ленты подписок пользователей"
+
+    def add_arguments(self, parser):
+        parser.add_argument("usernames", nargs="*")
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(follower__isnull=False).distinct()
+        if options["usernames"]:
+            users = users.filter(username__in=options["usernames"])
+        for user in users.iterator():
+            timeline.rebuild(user)
+            self.stdout.write(f"{user.username}: {user.timeline.count()}")
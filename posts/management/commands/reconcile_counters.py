@@ -0,0 +1,54 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, Q
+
+from posts.counters import actual_post_counts, actual_user_counts
+from posts.models import Post, UserStats
+
+
+User = get_user_model()
+
+
+def drifted(queryset, actual):
+    mismatch = Q()
+    for name in actual:
+        mismatch |= ~Q(**{name: F(f"actual_{name}")})
+    annotations = {f"actual_{name}": value for name, value in actual.items()}
+    return queryset.annotate(**annotations).filter(mismatch).count()
+
+
+class Command(BaseCommand):
+    help = "Сверяет и исправляет счётчики подписок, постов и комментариев"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Только показать количество расхождений",
+        )
+
+    def handle(self, *args, **options):
+        missing = User.objects.filter(stats__isnull=True)
+        post_drift = drifted(Post.objects.all(), actual_post_counts())
+        user_drift = drifted(
+            UserStats.objects.all(), actual_user_counts("user")
+        )
+        self.stdout.write(
+            f"Постов с неверным счётчиком: {post_drift}\n"
+            f"Пользователей с неверными счётчиками: {user_drift}\n"
+            f"Пользователей без счётчиков: {missing.count()}"
+        )
+        if options["dry_run"]:
+            return
+
+        with transaction.atomic():
+            UserStats.objects.bulk_create(
+                [UserStats(user_id=pk) for pk in missing.values_list("pk", flat=True)],
+                ignore_conflicts=True,
+            )
+            Post.objects.update(
+                version=F("version") + 1, **actual_post_counts()
+            )
+            UserStats.objects.update(**actual_user_counts("user"))
+        self.stdout.write(self.style.SUCCESS("Счётчики пересчитаны"))
@@ -0,0 +1,139 @@
+import os
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connections, transaction
+
+
+ALIAS = "load_test"
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.writes = 0
+        self.reads = 0
+        self.reads_during_writes = 0
+        self.errors = []
+        self.open_writes = 0
+
+    def add(self, name, value=1):
+        with self.lock:
+            setattr(self, name, getattr(self, name) + value)
+
+
+def writer(stats, count):
+    connection = connections[ALIAS]
+    try:
+        for number in range(count):
+            try:
+                # Чтение, затем запись — как add_comment и new_post.
+                with transaction.atomic(using=ALIAS):
+                    stats.add("open_writes")
+                    try:
+                        with connection.cursor() as cursor:
+                            cursor.execute("SELECT COUNT(*) FROM load_test")
+                            cursor.execute(
+                                "INSERT INTO load_test (body) VALUES (%s)",
+                                [f"row {number}"],
+                            )
+                        time.sleep(0.001)
+                    finally:
+                        stats.add("open_writes", -1)
+                stats.add("writes")
+            except DatabaseError as exc:
+                stats.errors.append(str(exc))
+    finally:
+        connection.close()
+
+
+def reader(stats, count):
+    connection = connections[ALIAS]
+    try:
+        for _ in range(count):
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT COUNT(*), MAX(id) FROM load_test")
+                    cursor.fetchone()
+                stats.add("reads")
+                if stats.open_writes:
+                    stats.add("reads_during_writes")
+            except DatabaseError as exc:
+                stats.errors.append(str(exc))
+    finally:
+        connection.close()
+
+
+def run_load_test(writers=4, readers=4, writes=100, reads=500, **overrides):
+    """Пишет и читает из потоков во временную базу с настройками default.
+
+    overrides заменяют ключи DATABASES['default'], например PRAGMAS.
+    Возвращает Stats и время работы в секундах.
+    """
+    if ALIAS in connections.databases:
+        raise CommandError("Нагрузочный тест уже запущен")
+    settings_dict = dict(connections["default"].settings_dict, **overrides)
+    if settings_dict["ENGINE"] != "yatube.sqlite":
+        raise CommandError("Нагрузочный тест рассчитан на yatube.sqlite")
+    stats = Stats()
+    with tempfile.TemporaryDirectory() as directory:
+        settings_dict["NAME"] = os.path.join(directory, "load_test.sqlite3")
+        connections.databases[ALIAS] = settings_dict
+        try:
+            with connections[ALIAS].cursor() as cursor:
+                cursor.execute(
+                    "CREATE TABLE load_test "
+                    "(id INTEGER PRIMARY KEY, body TEXT NOT NULL)"
+                )
+            connections[ALIAS].close()
+            threads = [
+                threading.Thread(target=writer, args=(stats, writes))
+                for _ in range(writers)
+            ] + [
+                threading.Thread(target=reader, args=(stats, reads))
+                for _ in range(readers)
+            ]
+            started = time.monotonic()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.monotonic() - started
+        finally:
+            connections[ALIAS].close()
+            del connections[ALIAS]
+            del connections.databases[ALIAS]
+    return stats, elapsed
+
+
+class Command(BaseCommand):
+    help = (
+        "Параллельно пишет и читает во временную базу SQLite с PRAGMA "
+        "из настроек и показывает пропускную способность и ошибки"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--writers", type=int, default=4)
+        parser.add_argument("--readers", type=int, default=4)
+        parser.add_argument(
+            "--writes", type=int, default=100, help="Записей на поток"
+        )
+        parser.add_argument(
+            "--reads", type=int, default=500, help="Чтений на поток"
+        )
+
+    def handle(self, *args, **options):
+        stats, elapsed = run_load_test(
+            options["writers"], options["readers"],
+            options["writes"], options["reads"],
+        )
+        self.stdout.write(
+            f"Записей: {stats.writes} ({stats.writes / elapsed:.0f}/с)\n"
+            f"Чтений: {stats.reads} ({stats.reads / elapsed:.0f}/с)\n"
+            f"Чтений во время записи: {stats.reads_during_writes}\n"
+            f"Ошибок: {len(stats.errors)}"
+        )
+        for error in sorted(set(stats.errors)):
+            self.stderr.write(error)
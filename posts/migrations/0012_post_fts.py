@@ -0,0 +1,56 @@
+# Generated by Django 2.2 on 2026-10-18 13:30
+
+import re
+
+import snowballstemmer
+from django.db import migrations
+
+
+class SqliteRunSQL(migrations.RunSQL):
+    """RunSQL только для SQLite: FTS5 в других базах нет."""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'sqlite':
+            super().database_forwards(
+                app_label, schema_editor, from_state, to_state
+            )
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'sqlite':
+            super().database_backwards(
+                app_label, schema_editor, from_state, to_state
+            )
+
+
+def index_existing_posts(apps, schema_editor):
+    # Те же основы, что строит posts.search.stem на момент миграции.
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    stemmer = snowballstemmer.stemmer('russian')
+    Post = apps.get_model('posts', 'Post')
+    rows = [
+        (pk, ' '.join(stemmer.stemWords(
+            re.findall(r'\w+', text.lower().replace('ё', 'е'))
+        )))
+        for pk, text in Post.objects.values_list('id', 'text')
+    ]
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany(
+            'INSERT INTO posts_post_fts (rowid, text) VALUES (%s, %s)', rows
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_post_version'),
+    ]
+
+    operations = [
+        SqliteRunSQL(
+            "CREATE VIRTUAL TABLE posts_post_fts USING fts5("
+            "text, tokenize='unicode61 remove_diacritics 2')",
+            "DROP TABLE IF EXISTS posts_post_fts",
+        ),
+        migrations.RunPython(index_existing_posts, migrations.RunPython.noop),
+    ]
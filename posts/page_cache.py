@@ -0,0 +1,159 @@
+import hashlib
+import threading
+import time
+from collections import Counter
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+
+HITS_KEY = "page_cache:hits"
+MISSES_KEY = "page_cache:misses"
+
+# Как часто, в секундах, попадания и промахи процесса переносятся в кеш.
+FLUSH_INTERVAL = 10
+
+_counts = Counter()
+_counts_lock = threading.Lock()
+_flushed_at = time.monotonic()
+
+
+def index_feed():
+    return "index"
+
+
+def group_feed(slug):
+    return f"group:{slug}"
+
+
+def profile_feed(username):
+    return f"profile:{username}"
+
+
+def _record(key):
+    """Копит попадания и промахи в памяти процесса, как yatube.connections."""
+    with _counts_lock:
+        _counts[key] += 1
+        due = time.monotonic() - _flushed_at >= FLUSH_INTERVAL
+    if due:
+        flush()
+
+
+def flush():
+    """Переносит попадания и промахи процесса в общие счётчики кеша."""
+    global _flushed_at
+    with _counts_lock:
+        pending = dict(_counts)
+        _counts.clear()
+        _flushed_at = time.monotonic()
+    for key, delta in pending.items():
+        try:
+            cache.add(key, 0, None)
+            cache.incr(key, delta)
+        except Exception:
+            # Статистика не должна ронять отдачу страницы.
+            pass
+
+
+def reset():
+    with _counts_lock:
+        _counts.clear()
+    cache.delete_many([HITS_KEY, MISSES_KEY])
+
+
+def _generation_key(feed):
+    return f"page_cache:generation:{feed}"
+
+
+def generation(feed):
+    """Время последнего изменения ленты в миллисекундах.
+
+    Если счётчик вытеснен из кеша или истёк, новое поколение не совпадёт
+    со старым.
+    """
+    key = _generation_key(feed)
+    cache.add(
+        key, int(time.time() * 1000), settings.PAGE_CACHE_GENERATION_TIMEOUT
+    )
+    return cache.get(key)
+
+
+def _bump(feeds):
+    now = int(time.time() * 1000)
+    for feed in feeds:
+        current = cache.get(_generation_key(feed))
+        if current is not None:
+            cache.set(
+                _generation_key(feed),
+                max(current + 1, now),
+                settings.PAGE_CACHE_GENERATION_TIMEOUT,
+            )
+
+
+def invalidate(*feeds):
+    """Меняет поколение лент после фиксации текущей транзакции.
+
+    Если сменить его раньше, параллельный запрос успеет собрать страницу
+    из ещё не изменённых строк и сохранить её под новым поколением.
+    """
+    transaction.on_commit(lambda: _bump(feeds))
+
+
+def invalidate_groups(group_ids):
+    """Сбрасывает главную ленту и ленты перечисленных групп."""
+    from .models import Group
+
+    slugs = Group.objects.filter(pk__in=group_ids).values_list("slug", flat=True)
+    invalidate(index_feed(), *(group_feed(slug) for slug in slugs))
+
+
+def invalidate_profiles(user_ids):
+    from django.contrib.auth import get_user_model
+
+    usernames = get_user_model().objects.filter(pk__in=user_ids).values_list(
+        "username", flat=True
+    )
+    invalidate(*(profile_feed(username) for username in usernames))
+
+
+def invalidate_posts(posts):
+    """Сбрасывает все ленты, в которых показаны посты из queryset posts."""
+    invalidate_groups(posts.values("group_id"))
+    invalidate_profiles(posts.values("author_id"))
+
+
+def page_key(feed, request):
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f"page_cache:{feed}:{generation(feed)}:{path}"
+
+
+def stats():
+    flush()
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    return {"hits": hits, "misses": misses}
+
+
+def cache_anonymous_page(feed_name):
+    """Кеширует страницу ленты для анонимных GET-запросов до изменения ленты."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != "GET" or request.user.is_authenticated:
+                return view(request, *args, **kwargs)
+            key = page_key(feed_name(*args, **kwargs), request)
+            response = cache.get(key)
+            if response is not None:
+                _record(HITS_KEY)
+                response["X-Page-Cache"] = "HIT"
+                return response
+            _record(MISSES_KEY)
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(key, response, settings.PAGE_CACHE_TIMEOUT)
+            response["X-Page-Cache"] = "MISS"
+            return response
+        return wrapper
+    return decorator
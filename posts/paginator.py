@@ -0,0 +1,183 @@
+import base64
+import binascii
+
+from django.core.paginator import Paginator
+from django.db.models import Q, QuerySet
+from django.utils.dateparse import parse_datetime
+
+
+# Наибольший id, который помещается в INTEGER SQLite и bigint PostgreSQL.
+MAX_PK = 2 ** 63 - 1
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(moment, pk):
+    raw = f"{moment.isoformat()}|{pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        moment, pk = raw.rsplit("|", 1)
+        moment = parse_datetime(moment)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidCursor(token)
+    if moment is None or not 0 < pk <= MAX_PK:
+        raise InvalidCursor(token)
+    return moment, pk
+
+
+class CursorPage:
+    """Страница, выбранная по ключу (время, id) без COUNT и OFFSET."""
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return f"<CursorPage of {len(self.object_list)} items>"
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if self._has_next and self.object_list:
+            return self.paginator.cursor_of(self.object_list[-1])
+        return None
+
+    @property
+    def previous_cursor(self):
+        if self._has_previous and self.object_list:
+            return self.paginator.cursor_of(self.object_list[0])
+        return None
+
+
+class CursorPaginator:
+    """Постраничный вывод по ключу (время, id), по умолчанию ленты постов.
+
+    Работает и с моделями, и со строками .values(), если в них есть ключ.
+    """
+    cursor = True
+
+    def __init__(self, queryset, per_page, key=("pub_date", "id"),
+                 descending=True):
+        self.key = key
+        self.descending = descending
+        sign = "-" if descending else ""
+        self.queryset = queryset.order_by(*(sign + field for field in key))
+        self.per_page = per_page
+
+    def cursor_of(self, row):
+        if isinstance(row, dict):
+            return encode_cursor(*(row[field] for field in self.key))
+        return encode_cursor(*(getattr(row, field) for field in self.key))
+
+    def get_page(self, after=None, before=None):
+        try:
+            if before:
+                return self._page_before(*decode_cursor(before))
+            if after:
+                return self._page_after(*decode_cursor(after))
+        except InvalidCursor:
+            pass
+        rows = list(self.queryset[:self.per_page + 1])
+        return CursorPage(
+            rows[:self.per_page], self, len(rows) > self.per_page, False
+        )
+
+    def _beyond(self, moment, pk, lookup):
+        field, tie = self.key
+        return self.queryset.filter(**{f"{field}__{lookup}e": moment}).filter(
+            Q(**{f"{field}__{lookup}": moment}) | Q(**{f"{tie}__{lookup}": pk})
+        )
+
+    def after(self, moment, pk):
+        return self._beyond(moment, pk, "lt" if self.descending else "gt")
+
+    def before(self, moment, pk):
+        sign = "" if self.descending else "-"
+        return self._beyond(
+            moment, pk, "gt" if self.descending else "lt"
+        ).order_by(*(sign + field for field in self.key))
+
+    def _page_after(self, moment, pk):
+        rows = list(self.after(moment, pk)[:self.per_page + 1])
+        return CursorPage(
+            rows[:self.per_page], self, len(rows) > self.per_page, True
+        )
+
+    def _page_before(self, moment, pk):
+        rows = list(self.before(moment, pk)[:self.per_page + 1])
+        has_previous = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        rows.reverse()
+        return CursorPage(rows, self, True, has_previous)
+
+
+def page_window(number, num_pages, around=2, edges=1):
+    """Номера страниц вокруг текущей и по краям; None — пропуск (…).
+
+    Длина списка не зависит от числа страниц: не больше
+    2 * edges + 2 * around + 3 элементов.
+    """
+    shown = set(range(1, min(edges, num_pages) + 1))
+    shown.update(range(max(num_pages - edges + 1, 1), num_pages + 1))
+    shown.update(
+        range(max(number - around, 1), min(number + around, num_pages) + 1)
+    )
+    window = []
+    previous = 0
+    for page in sorted(shown):
+        if page - previous == 2:
+            # Пропуск ровно одной страницы показываем номером, а не «…».
+            window.append(previous + 1)
+        elif page - previous > 2:
+            window.append(None)
+        window.append(page)
+        previous = page
+    return window
+
+
+def paginate(request, queryset, per_page=10, count=None,
+             cursor_paginator=CursorPaginator):
+    after = request.GET.get("after")
+    before = request.GET.get("before")
+    if after or before:
+        paginator = cursor_paginator(queryset, per_page)
+        return paginator, paginator.get_page(after=after, before=before)
+
+    if isinstance(queryset, QuerySet):
+        queryset = queryset.order_by("-pub_date", "-id")
+    paginator = Paginator(queryset, per_page)
+    if count is not None:
+        paginator.count = count()
+    page = paginator.get_page(request.GET.get("page"))
+    page.next_cursor = None
+    if page.has_next():
+        post = page[len(page) - 1]
+        page.next_cursor = encode_cursor(post.pub_date, post.pk)
+    return paginator, page
@@ -0,0 +1,56 @@
+import logging
+import os
+
+from django.template import TemplateSyntaxError, engines
+from django.template.loaders.cached import Loader as CachedLoader
+
+
+logger = logging.getLogger(__name__)
+
+
+def template_names(engine):
+    """Имена всех шаблонов, которые видят загрузчики движка."""
+    names = []
+    for loader in engine.engine.template_loaders:
+        for source in getattr(loader, "loaders", [loader]):
+            for directory in source.get_dirs():
+                for root, _, files in os.walk(directory):
+                    for name in files:
+                        if name.startswith("."):
+                            continue
+                        path = os.path.relpath(os.path.join(root, name), directory)
+                        names.append(path.replace(os.sep, "/"))
+    return list(dict.fromkeys(names))
+
+
+def precompile(using="django"):
+    """Разбирает все шаблоны; с кеширующим загрузчиком они остаются в памяти.
+
+    Возвращает число шаблонов и список пар (имя, ошибка разбора).
+    """
+    engine = engines[using]
+    names = template_names(engine)
+    errors = []
+    for name in names:
+        try:
+            engine.get_template(name)
+        except TemplateSyntaxError as exc:
+            errors.append((name, exc))
+    return len(names), errors
+
+
+def is_cached(using="django"):
+    return any(
+        isinstance(loader, CachedLoader)
+        for loader in engines[using].engine.template_loaders
+    )
+
+
+def warm_up():
+    """Прогрев при старте процесса: первый запрос не разбирает шаблоны."""
+    if not is_cached():
+        return
+    count, errors = precompile()
+    for name, error in errors:
+        logger.error("Шаблон %s не разбирается: %s", name, error)
+    logger.info("Разобрано шаблонов: %s", count)
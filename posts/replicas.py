@@ -0,0 +1,96 @@
+import random
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+
+from . import page_cache
+
+
+STICKY_COOKIE = "read_primary"
+
+SAFE_METHODS = ("GET", "HEAD")
+
+_state = threading.local()
+
+
+def current_replica():
+    return getattr(_state, "replica", None)
+
+
+class ReplicaRouter:
+    """Чтение из реплики внутри представлений с replica_reads, остальное — primary."""
+
+    def db_for_read(self, model, **hints):
+        return current_replica() or "default"
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики — копии primary: объекты из них можно связывать.
+        databases = {"default", *settings.DATABASE_REPLICAS}
+        if {obj1._state.db, obj2._state.db} <= databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+def recently_changed(feed):
+    age = time.time() * 1000 - page_cache.generation(feed)
+    return age < settings.REPLICA_STICKY_SECONDS * 1000
+
+
+def replica_reads(feed_name=None):
+    """Отправляет чтения GET-запроса в случайную реплику.
+
+    Запрос остаётся на primary, если клиент недавно писал (см.
+    PrimaryStickinessMiddleware) или если лента feed_name изменилась
+    позже, чем реплика успевает догнать primary: иначе ETag и кеш
+    страниц нового поколения запомнили бы старые данные.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if (
+                not settings.DATABASE_REPLICAS
+                or request.method not in SAFE_METHODS
+                or STICKY_COOKIE in request.COOKIES
+                or feed_name and recently_changed(feed_name(*args, **kwargs))
+            ):
+                return view(request, *args, **kwargs)
+            _state.replica = random.choice(settings.DATABASE_REPLICAS)
+            try:
+                return view(request, *args, **kwargs)
+            finally:
+                _state.replica = None
+        return wrapper
+    return decorator
+
+
+class PrimaryStickinessMiddleware:
+    """После успешной записи клиент читает с primary REPLICA_STICKY_SECONDS."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (
+            settings.DATABASE_REPLICAS
+            and request.method not in SAFE_METHODS
+            and response.status_code < 400
+        ):
+            response.set_cookie(
+                STICKY_COOKIE,
+                "1",
+                max_age=settings.REPLICA_STICKY_SECONDS,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
@@ -0,0 +1,140 @@
+import re
+
+import snowballstemmer
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Post
+
+
+FTS_TABLE = "posts_post_fts"
+
+WORD_RE = re.compile(r"\w+")
+
+stemmer = snowballstemmer.stemmer("russian")
+
+
+def is_supported():
+    return connection.vendor == "sqlite"
+
+
+def stem_words(text):
+    words = WORD_RE.findall(text.lower().replace("ё", "е"))
+    return stemmer.stemWords(words)
+
+
+def stem(text):
+    return " ".join(stem_words(text))
+
+
+def match_query(query):
+    """Запрос FTS5: все основы слов запроса должны встретиться точно.
+
+    В индексе лежат основы, поэтому формы слова уже совпадают, а префикс
+    нашёл бы чужие слова: «кот» — «котлеты» и «который».
+    """
+    return " ".join(f'"{word}"' for word in stem_words(query))
+
+
+def index_post(post_id, text):
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [post_id])
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, text) VALUES (%s, %s)",
+            [post_id, stem(text)],
+        )
+
+
+def remove_post(post_id):
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [post_id])
+
+
+def rebuild(batch_size=1000):
+    rows = Post.objects.order_by().values_list("id", "text")
+    indexed = 0
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        batch = []
+        for post_id, text in rows.iterator(chunk_size=batch_size):
+            batch.append((post_id, stem(text)))
+            if len(batch) == batch_size:
+                cursor.executemany(
+                    f"INSERT INTO {FTS_TABLE} (rowid, text) VALUES (%s, %s)",
+                    batch,
+                )
+                indexed += len(batch)
+                batch = []
+        if batch:
+            cursor.executemany(
+                f"INSERT INTO {FTS_TABLE} (rowid, text) VALUES (%s, %s)", batch
+            )
+            indexed += len(batch)
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')"
+        )
+    return indexed
+
+
+def matching(queryset, query):
+    """Фильтр queryset по полнотекстовому индексу (без ранжирования)."""
+    if not is_supported():
+        words = WORD_RE.findall(query)
+        condition = Q()
+        for word in words:
+            condition &= Q(text__icontains=word)
+        return queryset.filter(condition)
+    if not match_query(query):
+        return queryset.none()
+    return queryset.filter(
+        pk__in=RawSQL(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s",
+            [match_query(query)],
+        )
+    )
+
+
+class SearchResults:
+    """Результаты поиска по релевантности (bm25) для Paginator."""
+
+    def __init__(self, query):
+        self.query = match_query(query)
+        self.raw_query = query
+
+    def count(self):
+        if not self.query:
+            return 0
+        if not is_supported():
+            return matching(Post.objects.all(), self.raw_query).count()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT COUNT(*) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s",
+                [self.query],
+            )
+            return cursor.fetchone()[0]
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        if not self.query:
+            return []
+        start = index.start or 0
+        limit = index.stop - start
+        if not is_supported():
+            return list(
+                matching(Post.objects.for_feed(), self.raw_query)
+                .order_by("-pub_date", "-id")[start:index.stop]
+            )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+                f"ORDER BY bm25({FTS_TABLE}) LIMIT %s OFFSET %s",
+                [self.query, limit, start],
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+        posts = Post.objects.for_feed().in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
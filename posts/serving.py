@@ -0,0 +1,173 @@
+import mimetypes
+import os
+import posixpath
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import (
+    FileResponse, Http404, HttpResponse, StreamingHttpResponse,
+)
+from django.urls import re_path
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+
+# Имена с хешем содержимого: posts/ab/cd/<sha256>.png, миниатюры sorl,
+# файлы ManifestStaticFilesStorage вида style.0123456789ab.css.
+HASHED_NAME_RE = re.compile(r"(?:^|\.)[0-9a-f]{12,}\.\w+$")
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+BLOCK_SIZE = 64 * 1024
+
+
+def is_immutable(path):
+    return bool(HASHED_NAME_RE.search(posixpath.basename(path)))
+
+
+def parse_range(header, size):
+    """(start, length) для одного диапазона Range, None — отдать весь файл.
+
+    ValueError, если диапазон не пересекается с файлом.
+    """
+    match = RANGE_RE.match(header or "")
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        length = min(int(last), size)
+        if length == 0:
+            raise ValueError(header)
+        return size - length, length
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError(header)
+    return start, end - start + 1
+
+
+def iter_range(file, start, length):
+    with file:
+        file.seek(start)
+        while length > 0:
+            block = file.read(min(BLOCK_SIZE, length))
+            if not block:
+                return
+            length -= len(block)
+            yield block
+
+
+def file_response(request, full_path, path, size, internal_url, validators):
+    content_type = mimetypes.guess_type(full_path)[0]
+    content_type = content_type or "application/octet-stream"
+    backend = settings.SENDFILE_BACKEND
+    if backend == "x-accel-redirect" and internal_url:
+        response = HttpResponse(content_type=content_type)
+        response["X-Accel-Redirect"] = internal_url + quote(path)
+        return response
+    if backend == "x-sendfile":
+        response = HttpResponse(content_type=content_type)
+        response["X-Sendfile"] = full_path
+        return response
+
+    if_range = request.META.get("HTTP_IF_RANGE")
+    byte_range = None
+    if if_range is None or if_range in validators:
+        try:
+            byte_range = parse_range(request.META.get("HTTP_RANGE"), size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+            return response
+    if byte_range is None:
+        # FileResponse отдаёт файл через wsgi.file_wrapper (sendfile).
+        return FileResponse(open(full_path, "rb"), content_type=content_type)
+    start, length = byte_range
+    response = StreamingHttpResponse(
+        iter_range(open(full_path, "rb"), start, length),
+        status=206,
+        content_type=content_type,
+    )
+    response["Content-Range"] = f"bytes {start}-{start + length - 1}/{size}"
+    response["Content-Length"] = str(length)
+    return response
+
+
+def serve(request, path, document_root, internal_url=None, hidden=()):
+    """Отдаёт файл из document_root с ETag, Range и долгим кешированием.
+
+    Файлы с хешем в имени помечаются immutable, остальные браузер
+    перепроверяет по ETag/Last-Modified. Саму передачу можно поручить
+    nginx (X-Accel-Redirect) или Apache (X-Sendfile), см. SENDFILE_BACKEND.
+    """
+    try:
+        full_path = safe_join(document_root, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    relative = os.path.relpath(full_path, document_root)
+    if not os.path.isfile(full_path) or relative.startswith(tuple(hidden)):
+        raise Http404
+    stat = os.stat(full_path)
+    mtime = int(stat.st_mtime)
+    etag = quote_etag(f"{mtime:x}-{stat.st_size:x}")
+    last_modified = http_date(mtime)
+
+    response = get_conditional_response(
+        request, etag=etag, last_modified=mtime
+    )
+    if response is None:
+        response = file_response(
+            request, full_path, path, stat.st_size, internal_url,
+            (etag, last_modified),
+        )
+    if response.status_code == 416:
+        return response
+    response["ETag"] = etag
+    response["Last-Modified"] = last_modified
+    response["Accept-Ranges"] = "bytes"
+    if is_immutable(path):
+        patch_cache_control(
+            response, public=True, max_age=settings.MEDIA_CACHE_MAX_AGE,
+            immutable=True,
+        )
+    else:
+        patch_cache_control(response, public=True, no_cache=True)
+    return response
+
+
+def serve_media(request, path):
+    return serve(
+        request,
+        path,
+        settings.MEDIA_ROOT,
+        settings.SENDFILE_INTERNAL_URL + "media/",
+        # Недокачанные загрузки, см. posts.uploads.
+        hidden=[settings.IMAGE_UPLOAD_TEMP_DIR + os.sep],
+    )
+
+
+def serve_static(request, path):
+    return serve(
+        request,
+        path,
+        settings.STATIC_ROOT,
+        settings.SENDFILE_INTERNAL_URL + "static/",
+    )
+
+
+def urlpatterns():
+    return [
+        re_path(
+            r"^%s(?P<path>.+)$" % re.escape(settings.MEDIA_URL.lstrip("/")),
+            serve_media,
+        ),
+        re_path(
+            r"^%s(?P<path>.+)$" % re.escape(settings.STATIC_URL.lstrip("/")),
+            serve_static,
+        ),
+    ]
@@ -0,0 +1,175 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_save, post_delete, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import cards, counters, page_cache, search, thumbnails, timeline
+from .models import Post, Group, Comment, Follow
+
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=Post)
+def count_new_post(sender, instance, created, **kwargs):
+    if created:
+        counters.adjust_user(instance.author_id, posts_count=1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.adjust_user(instance.author_id, posts_count=-1)
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, **kwargs):
+    if created:
+        counters.adjust_post(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    counters.adjust_post(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def count_new_follow(sender, instance, created, **kwargs):
+    if created:
+        counters.adjust_user(instance.user_id, following_count=1)
+        counters.adjust_user(instance.author_id, followers_count=1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    counters.adjust_user(instance.user_id, following_count=-1)
+    counters.adjust_user(instance.author_id, followers_count=-1)
+
+
+@receiver(post_save, sender=Post)
+def push_post_to_timelines(sender, instance, created, **kwargs):
+    if created:
+        timeline.fan_out_post(instance)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, **kwargs):
+    if created:
+        timeline.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def clear_timeline(sender, instance, **kwargs):
+    timeline.remove(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Post)
+def invalidate_edited_card(sender, instance, created, **kwargs):
+    if not created:
+        cards.bump(pk=instance.pk)
+
+
+@receiver(post_save, sender=Group)
+def invalidate_group_cards(sender, instance, created, **kwargs):
+    if not created:
+        cards.bump(group=instance)
+
+
+@receiver(pre_delete, sender=Group)
+def invalidate_deleted_group_cards(sender, instance, **kwargs):
+    # SET_NULL обнуляет group одним UPDATE без сигналов, поэтому заранее.
+    cards.bump(group=instance)
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_cards(sender, instance, created, update_fields, **kwargs):
+    if not created and (update_fields is None or "username" in update_fields):
+        cards.bump(author=instance)
+
+
+@receiver(pre_save, sender=Post)
+def remember_previous_state(sender, instance, **kwargs):
+    instance._previous_group_id, instance._previous_image = None, None
+    if instance.pk is not None:
+        previous = (
+            Post.objects.filter(pk=instance.pk)
+            .values_list("group_id", "image")
+            .first()
+        )
+        if previous is not None:
+            instance._previous_group_id, instance._previous_image = previous
+
+
+@receiver(post_save, sender=Post)
+def forget_replaced_thumbnails(sender, instance, created, **kwargs):
+    if created or not instance.thumbnails:
+        return
+    if instance.image.name != getattr(instance, "_previous_image", None):
+        # post_edit сохраняет только поля формы, поэтому отдельный UPDATE.
+        instance.thumbnails = ""
+        Post.objects.filter(pk=instance.pk).update(thumbnails="")
+
+
+@receiver(post_save, sender=Post)
+def invalidate_saved_post_feeds(sender, instance, **kwargs):
+    previous = getattr(instance, "_previous_group_id", None)
+    page_cache.invalidate_groups([instance.group_id, previous])
+    page_cache.invalidate_profiles([instance.author_id])
+
+
+@receiver(post_delete, sender=Post)
+def invalidate_deleted_post_feeds(sender, instance, **kwargs):
+    page_cache.invalidate_groups([instance.group_id])
+    page_cache.invalidate_profiles([instance.author_id])
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_commented_post_feeds(sender, instance, **kwargs):
+    page_cache.invalidate_posts(Post.objects.filter(pk=instance.post_id))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group_feed(sender, instance, **kwargs):
+    page_cache.invalidate(
+        page_cache.index_feed(), page_cache.group_feed(instance.slug)
+    )
+
+
+@receiver(post_save, sender=Group)
+def invalidate_group_author_profiles(sender, instance, created, **kwargs):
+    if not created:
+        page_cache.invalidate_profiles(instance.group_posts.values("author_id"))
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_profiles(sender, instance, **kwargs):
+    page_cache.invalidate_profiles([instance.user_id, instance.author_id])
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_feeds(sender, instance, created, update_fields, **kwargs):
+    if not created and (update_fields is None or "username" in update_fields):
+        page_cache.invalidate_groups(instance.posts.values("group_id"))
+        page_cache.invalidate_profiles([instance.pk])
+
+
+@receiver(post_save, sender=Post)
+def index_post_text(sender, instance, update_fields, **kwargs):
+    if not search.is_supported():
+        return
+    if update_fields is None or "text" in update_fields:
+        search.index_post(instance.pk, instance.text)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    if search.is_supported():
+        search.remove_post(instance.pk)
+
+
+@receiver(post_save, sender=Post)
+def queue_thumbnails(sender, instance, **kwargs):
+    previous = getattr(instance, "_previous_image", None)
+    if instance.image and instance.image.name != previous:
+        thumbnails.enqueue(instance)
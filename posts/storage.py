@@ -0,0 +1,92 @@
+import hashlib
+import os
+import posixpath
+import tempfile
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+def content_hash(content):
+    hasher = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks():
+        hasher.update(chunk)
+    content.seek(0)
+    return hasher.hexdigest()
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранит файлы под SHA-256 их содержимого: posts/ab/cd/abcd….png.
+
+    Одинаковые загрузки занимают на диске одно место, а миниатюры sorl,
+    которые строятся по имени исходника, становятся общими для всех постов
+    с этой картинкой. Файлы не удаляются вместе с постами: их могут
+    использовать другие посты.
+    """
+
+    def hashed_name(self, name, content):
+        digest = getattr(content, "content_hash", None) or content_hash(content)
+        directory = posixpath.dirname(name)
+        extension = posixpath.splitext(name)[1].lower()
+        return posixpath.join(
+            directory, digest[:2], digest[2:4], digest + extension
+        )
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, "chunks"):
+            content = File(content, name)
+        name = self.hashed_name(name, content)
+        if not self.exists(name):
+            self._publish(name, content)
+        return name
+
+    def _publish(self, name, content):
+        """Атомарно ставит содержимое под именем name.
+
+        Загрузка, уже лежащая во временном файле на диске, ставится на место
+        без копирования; иначе содержимое пишется рядом во временный файл.
+        """
+        path = self.path(name)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        if hasattr(content, "temporary_file_path"):
+            try:
+                self._place(content.temporary_file_path(), path)
+                return
+            except OSError:
+                # Временный файл на другой файловой системе: копируем.
+                pass
+        descriptor, temp_path = tempfile.mkstemp(
+            dir=directory, prefix=".upload-"
+        )
+        try:
+            with os.fdopen(descriptor, "wb") as temp:
+                for chunk in content.chunks():
+                    temp.write(chunk)
+            self._place(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def _place(self, source, path):
+        """Ставит файл source под путём path.
+
+        Между exists() и записью тот же файл мог сохранить параллельный
+        запрос: os.link не перезаписывает существующий файл, и занятое имя
+        означает, что такое содержимое уже лежит на диске.
+        """
+        mode = self.file_permissions_mode
+        os.chmod(source, 0o644 if mode is None else mode)
+        try:
+            os.link(source, path)
+        except FileExistsError:
+            pass
+        except OSError:
+            # Файловая система без жёстких ссылок: то же содержимое можно
+            # атомарно записать поверх.
+            os.replace(source, path)
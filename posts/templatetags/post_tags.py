@@ -0,0 +1,45 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from posts import thumbnails
+from posts.cards import render_cards
+from posts.paginator import page_window
+
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def post_cards(context, posts):
+    card = context.template.engine.get_template("includes/post_item.html")
+
+    def render(post):
+        with context.push(post=post):
+            return card.render(context)
+
+    user = context.get("user")
+    if user is not None and not user.is_authenticated:
+        user = None
+    return mark_safe("".join(render_cards(
+        list(posts), render, user, prepare=thumbnails.attach_feed_images
+    )))
+
+
+@register.inclusion_tag("includes/post_image.html")
+def post_image(post):
+    if not post.image:
+        return {}
+    if not hasattr(post, "feed_images"):
+        thumbnails.attach_feed_images([post])
+    images = post.feed_images
+    return {
+        "image": images["default"],
+        "webp": images["webp"],
+        "pending": images["default"] is None,
+    }
+
+
+@register.simple_tag
+def page_numbers(page, around=2):
+    """Окно номеров страниц для includes/paginator.html."""
+    return page_window(page.number, page.paginator.num_pages, around=around)
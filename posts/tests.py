@@ -1,8 +1,55 @@
-from django.test import TestCase, Client
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.test import (
+    TestCase, TransactionTestCase, Client, RequestFactory, override_settings,
+)
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError, connection, connections, router, transaction
+from django.http import Http404
+from django.core.paginator import Paginator
+from django.template import engines
+from django.template.loader import render_to_string
 from django.urls import reverse
+from PIL import Image
+from sorl.thumbnail import default, get_thumbnail
+from yatube import connections as db_connections
+
+from . import (
+    comment_writes, feeds, follows, page_cache, precompile, replicas, search,
+    serving, thumbnails, views,
+)
+from .caching import get_or_set
+from .counters import user_stats
+from .paginator import encode_cursor, page_window
+from .management.commands.explain_feeds import feed_queries
+from .management.commands.sqlite_load_test import run_load_test
+from .models import Post, Group, Comment, Follow, TimelineEntry, UserStats
+from .timeline import Timeline, TimelinePaginator
+
 
-from .models import Post
+class QueryBudgetMixin:
+    def assertQueryBudget(self, url, budget):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(
+            len(queries),
+            budget,
+            f"{url} выполнил {len(queries)} запросов при бюджете {budget}",
+        )
+        return len(queries)
 
 
 class TestPosts(TestCase):
@@ -157,10 +204,12 @@ class TestProfiles(TestCase):
         )
         self.assertEqual(response.status_code, 200)
         self.assertIn(self.user, User.objects.all())
-        with self.assertRaises(Exception, msg="Такого пользователя не существует"):
-            response = self.client.get( 
-                reverse("profile", kwargs={"username": "sara"})
-            )
+        response = self.client.get(
+            reverse("profile", kwargs={"username": "sara"})
+        )
+        self.assertEqual(
+            response.status_code, 404, msg="Такого пользователя не существует"
+        )
 
 
 class TestSubFunctions(TestCase):
@@ -280,3 +329,1509 @@ class TestComments(TestCase):
             msg_prefix='',
             html=False
         )
+
+
+class TestCursorPagination(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username="kyle",
+            email="kyle.r@skynet.com",
+            password="12345678"
+        )
+        for i in range(25):
+            Post.objects.create(text=f"post {i}", author=self.user)
+
+    def test_walk_feed_with_cursors(self):
+        response = self.client.get(reverse("index"))
+        seen = [post.id for post in response.context["page"]]
+        token = response.context["page"].next_cursor
+        while token:
+            response = self.client.get(reverse("index"), {"after": token})
+            page = response.context["page"]
+            seen += [post.id for post in page]
+            token = page.next_cursor
+        expected = list(
+            Post.objects.order_by("-pub_date", "-id").values_list("id", flat=True)
+        )
+        self.assertEqual(seen, expected)
+
+    def test_previous_cursor_returns_preceding_page(self):
+        first = self.client.get(reverse("index")).context["page"]
+        second = self.client.get(
+            reverse("index"), {"after": first.next_cursor}
+        ).context["page"]
+        self.assertTrue(second.has_previous())
+        back = self.client.get(
+            reverse("index"), {"before": second.previous_cursor}
+        ).context["page"]
+        self.assertEqual(list(back), list(first))
+        self.assertFalse(back.has_previous())
+
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        response = self.client.get(reverse("index"), {"after": "garbage!"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context["page"]), 10)
+        self.assertFalse(response.context["page"].has_previous())
+
+    def test_out_of_range_cursor_falls_back_to_first_page(self):
+        moment = Post.objects.latest("pub_date").pub_date
+        for pk in [2 ** 64, 0]:
+            with self.subTest(pk=pk):
+                response = self.client.get(
+                    reverse("index"), {"after": encode_cursor(moment, pk)}
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertFalse(response.context["page"].has_previous())
+
+
+class TestPageWindow(TestCase):
+    def test_window_around_current_page(self):
+        self.assertEqual(page_window(1, 1), [1])
+        self.assertEqual(page_window(1, 5), [1, 2, 3, 4, 5])
+        self.assertEqual(page_window(1, 100), [1, 2, 3, None, 100])
+        self.assertEqual(
+            page_window(50, 100), [1, None, 48, 49, 50, 51, 52, None, 100]
+        )
+        self.assertEqual(page_window(5, 100), [1, 2, 3, 4, 5, 6, 7, None, 100])
+        self.assertEqual(page_window(100, 100), [1, None, 98, 99, 100])
+
+    def test_paginator_html_does_not_grow_with_feed(self):
+        def links(count):
+            page = Paginator(range(count), 10).get_page(count // 20)
+            html = render_to_string(
+                "includes/paginator.html",
+                {"items": page, "paginator": page.paginator},
+            )
+            return html.count("<li")
+
+        self.assertEqual(links(100000), links(10000))
+        self.assertLessEqual(links(100000), 11)
+
+
+class TestFeedQueries(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.reader = User.objects.create_user(
+            username="miles",
+            email="miles.d@skynet.com",
+            password="12345678"
+        )
+        self.author = User.objects.create_user(
+            username="dyson",
+            email="dyson.m@skynet.com",
+            password="12345678"
+        )
+        self.group = Group.objects.create(
+            title="Cyberdyne", slug="cyberdyne", description="T-800"
+        )
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.client.force_login(self.reader)
+
+    def add_posts(self, count):
+        for i in range(count):
+            post = Post.objects.create(
+                text=f"post {i}", author=self.author, group=self.group
+            )
+            Comment.objects.create(post=post, author=self.reader, text="hi")
+
+    def feed_urls(self):
+        return [
+            reverse("index"),
+            reverse("group_posts", kwargs={"slug": self.group.slug}),
+            reverse("profile", kwargs={"username": self.author.username}),
+            reverse("follow_index"),
+        ]
+
+    def test_feed_queries_do_not_grow_with_page_size(self):
+        self.add_posts(2)
+        small = [self.assertQueryBudget(url, 10) for url in self.feed_urls()]
+        cache.clear()
+        self.add_posts(8)
+        full = [self.assertQueryBudget(url, 10) for url in self.feed_urls()]
+        self.assertEqual(small, full)
+
+    def test_feed_shows_comment_counts(self):
+        self.add_posts(1)
+        response = self.client.get(reverse("index"))
+        self.assertEqual(response.context["page"][0].comment_count, 1)
+
+
+class TestFollowTimeline(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.reader = User.objects.create_user(
+            username="john",
+            email="john.c@skynet.com",
+            password="12345678"
+        )
+        self.author = User.objects.create_user(
+            username="t1000",
+            email="t1000@skynet.com",
+            password="12345678"
+        )
+        self.client.force_login(self.reader)
+
+    def follow_page(self):
+        return list(self.client.get(reverse("follow_index")).context["page"])
+
+    def test_new_post_is_pushed_to_followers(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(text="liquid metal", author=self.author)
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.reader, post=post).exists()
+        )
+        self.assertEqual(self.follow_page(), [post])
+
+    @override_settings(TIMELINE_LENGTH=3)
+    def test_follow_backfills_capped_timeline(self):
+        for i in range(5):
+            Post.objects.create(text=f"post {i}", author=self.author)
+        self.client.get(
+            reverse("profile_follow", kwargs={"username": self.author})
+        )
+        self.assertEqual(self.reader.timeline.count(), 3)
+        self.client.get(
+            reverse("profile_unfollow", kwargs={"username": self.author})
+        )
+        self.assertEqual(self.reader.timeline.count(), 0)
+        self.assertEqual(self.follow_page(), [])
+
+    @override_settings(TIMELINE_LENGTH=2)
+    def test_long_timeline_is_trimmed_on_read(self):
+        other = User.objects.create_user(username="t800", password="12345678")
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.reader, author=other)
+        Post.objects.create(text="post 1", author=self.author)
+        own = Post.objects.create(text="own", author=other)
+        last = Post.objects.create(text="post 2", author=self.author)
+        self.assertEqual(self.reader.timeline.count(), 3)
+        self.assertEqual(self.follow_page(), [last, own])
+        entries = self.reader.timeline.order_by("-pub_date")
+        self.assertEqual(
+            list(entries.values_list("post", flat=True)), [last.pk, own.pk]
+        )
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_pushed_and_pulled_posts_are_merged(self):
+        pushed = User.objects.create_user(username="t800", password="12345678")
+        fan = User.objects.create_user(username="tx", password="12345678")
+        Follow.objects.create(user=self.reader, author=pushed)
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=fan, author=self.author)
+        posts = [
+            Post.objects.create(
+                text=f"post {i}", author=self.author if i % 2 else pushed
+            )
+            for i in range(5)
+        ]
+        posts.reverse()
+        self.assertFalse(
+            TimelineEntry.objects.filter(post__author=self.author).exists()
+        )
+        self.assertEqual(self.follow_page(), posts)
+
+        paginator = TimelinePaginator(Timeline(self.reader.pk), 2)
+        first = paginator.get_page()
+        second = paginator.get_page(after=first.next_cursor)
+        back = paginator.get_page(before=second.previous_cursor)
+        self.assertEqual(list(first), posts[:2])
+        self.assertEqual(list(second), posts[2:4])
+        self.assertEqual(list(back), posts[:2])
+        self.assertEqual(Timeline(self.reader.pk).count(), 5)
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1)
+    def test_author_stays_pulled_below_the_limit(self):
+        fan = User.objects.create_user(username="tx", password="12345678")
+        Follow.objects.create(user=self.reader, author=self.author)
+        first = Post.objects.create(text="pushed", author=self.author)
+        Follow.objects.create(user=fan, author=self.author)
+        second = Post.objects.create(text="pulled", author=self.author)
+        Follow.objects.filter(user=fan).delete()
+        third = Post.objects.create(text="still pulled", author=self.author)
+        self.assertTrue(UserStats.objects.get(user=self.author).pull_timeline)
+        self.assertEqual(
+            list(self.reader.timeline.values_list("post", flat=True)),
+            [first.pk],
+        )
+        self.assertEqual(self.follow_page(), [third, second, first])
+        Follow.objects.create(user=fan, author=self.author)
+        self.assertFalse(fan.timeline.exists())
+        self.client.force_login(fan)
+        self.assertEqual(self.follow_page(), [third, second, first])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_popular_author_is_pulled_on_read(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(text="come with me", author=self.author)
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.follow_page(), [post])
+
+
+class TestCounters(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username="reese",
+            email="kyle.reese@skynet.com",
+            password="12345678"
+        )
+        self.author = User.objects.create_user(
+            username="silberman",
+            email="silberman@skynet.com",
+            password="12345678"
+        )
+        self.client.force_login(self.user)
+
+    def test_write_paths_maintain_counters(self):
+        self.client.post(reverse("new"), {"text": "text"})
+        post = Post.objects.get(author=self.user)
+        self.client.post(
+            reverse("add_comment", kwargs={"username": self.user, "post_id": post.pk}),
+            {"text": "comment"}
+        )
+        self.client.get(reverse("profile_follow", kwargs={"username": self.author}))
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+        self.assertEqual(self.user.stats.posts_count, 1)
+        self.assertEqual(self.user.stats.following_count, 1)
+        self.assertEqual(self.author.stats.followers_count, 1)
+
+        self.client.get(reverse("profile_unfollow", kwargs={"username": self.author}))
+        post.comments.all().delete()
+        post.refresh_from_db()
+        self.user.stats.refresh_from_db()
+        self.assertEqual(post.comment_count, 0)
+        self.assertEqual(self.user.stats.following_count, 0)
+
+    def test_reconcile_counters_fixes_drift(self):
+        post = Post.objects.create(text="text", author=self.author)
+        Comment.objects.create(post=post, author=self.user, text="comment")
+        Follow.objects.create(user=self.user, author=self.author)
+        Post.objects.update(comment_count=7)
+        UserStats.objects.update(followers_count=0, posts_count=3)
+
+        call_command("reconcile_counters", stdout=StringIO())
+
+        post.refresh_from_db()
+        stats = UserStats.objects.get(user=self.author)
+        self.assertEqual(post.comment_count, 1)
+        self.assertEqual(post.version, 2)
+        self.assertEqual(stats.followers_count, 1)
+        self.assertEqual(stats.posts_count, 1)
+
+
+@skipUnless(connection.vendor == "sqlite", "EXPLAIN QUERY PLAN есть только в SQLite")
+class TestFeedIndexes(TestCase):
+    expected = {
+        "index": "post_pub_date_idx",
+        "index ?after=": "post_pub_date_idx",
+        "group_posts": "post_group_pub_date_idx",
+        "group_posts ?after=": "post_group_pub_date_idx",
+        "profile": "post_author_pub_date_idx",
+        "profile ?after=": "post_author_pub_date_idx",
+        "post_view comments": "comment_post_created_idx",
+        "post_view comments ?after=": "comment_post_created_idx",
+        "followers": "follow_author_user_idx",
+        "follow_index entries": "timeline_user_pub_date_idx",
+        "follow_index entries ?after=": "timeline_user_pub_date_idx",
+        "follow_index pulled": "post_author_pub_date_idx",
+    }
+
+    def test_feed_queries_use_indexes(self):
+        queries = feed_queries()
+        for name, index in self.expected.items():
+            with self.subTest(query=name):
+                plan = queries[name].explain().replace("COVERING ", "")
+                self.assertIn(f"USING INDEX {index}", plan)
+
+
+class TestPostCardCache(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username="dyson2",
+            email="dyson2@skynet.com",
+            password="12345678"
+        )
+        self.post = Post.objects.create(text="skynet", author=self.user)
+
+    def test_cards_are_fetched_with_one_get_many(self):
+        Post.objects.create(text="judgment day", author=self.user)
+        self.client.get(reverse("profile", kwargs={"username": self.user}))
+        with mock.patch.object(cache, "get_many", wraps=cache.get_many) as get_many:
+            with mock.patch.object(cache, "set_many") as set_many:
+                self.client.get(
+                    reverse("profile", kwargs={"username": self.user})
+                )
+        get_many.assert_called_once()
+        set_many.assert_not_called()
+
+    def test_edit_and_comment_bump_version(self):
+        self.client.force_login(self.user)
+        self.client.post(
+            reverse("post_edit", kwargs={"username": self.user, "post_id": self.post.pk}),
+            {"text": "no fate"}
+        )
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.version, 1)
+        response = self.client.get(
+            reverse("profile", kwargs={"username": self.user})
+        )
+        self.assertContains(response, "no fate")
+
+        self.client.post(
+            reverse("add_comment", kwargs={"username": self.user, "post_id": self.post.pk}),
+            {"text": "comment"}
+        )
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.version, 2)
+        response = self.client.get(
+            reverse("profile", kwargs={"username": self.user})
+        )
+        self.assertContains(response, "1 комментариев")
+
+    def test_group_delete_bumps_version(self):
+        group = Group.objects.create(title="Skynet", slug="skynet")
+        Post.objects.filter(pk=self.post.pk).update(group=group)
+        group.delete()
+        self.post.refresh_from_db()
+        self.assertIsNone(self.post.group_id)
+        self.assertEqual(self.post.version, 1)
+
+
+class TestAnonymousPageCache(TransactionTestCase):
+    def setUp(self):
+        page_cache.reset()
+        cache.clear()
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username="sarah_c",
+            email="sarah.c@skynet.com",
+            password="12345678"
+        )
+        self.group = Group.objects.create(
+            title="Resistance", slug="resistance", description="1997"
+        )
+        self.other = Group.objects.create(
+            title="Cyberdyne", slug="cyberdyne-2", description="T-800"
+        )
+
+    def get(self, url):
+        return self.client.get(url)["X-Page-Cache"]
+
+    def test_repeated_anonymous_get_is_served_from_cache(self):
+        url = reverse("index")
+        self.assertEqual(self.get(url), "MISS")
+        self.assertEqual(self.get(url), "HIT")
+        self.assertEqual(page_cache.stats(), {"hits": 1, "misses": 1})
+
+    def test_hits_and_misses_are_counted_in_process(self):
+        url = reverse("index")
+        with mock.patch.object(page_cache, "FLUSH_INTERVAL", 3600), \
+                mock.patch.object(cache, "incr") as incr:
+            self.get(url)
+            self.get(url)
+        incr.assert_not_called()
+        self.assertEqual(page_cache.stats(), {"hits": 1, "misses": 1})
+
+    def test_unknown_group_generation_expires(self):
+        url = reverse("group_posts", kwargs={"slug": "no-such-group"})
+        with mock.patch.object(cache, "add", wraps=cache.add) as add:
+            self.client.get(url)
+        add.assert_any_call(
+            "page_cache:generation:group:no-such-group",
+            mock.ANY,
+            settings.PAGE_CACHE_GENERATION_TIMEOUT,
+        )
+
+    def test_logged_in_users_bypass_cache(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("index"))
+        self.assertFalse(response.has_header("X-Page-Cache"))
+
+    def test_new_post_invalidates_only_its_feeds(self):
+        index = reverse("index")
+        group = reverse("group_posts", kwargs={"slug": self.group.slug})
+        other = reverse("group_posts", kwargs={"slug": self.other.slug})
+        for url in (index, group, other):
+            self.get(url)
+        Post.objects.create(text="new", author=self.user, group=self.group)
+        self.assertEqual(self.get(index), "MISS")
+        self.assertEqual(self.get(group), "MISS")
+        self.assertEqual(self.get(other), "HIT")
+
+    def test_moving_post_invalidates_previous_group(self):
+        post = Post.objects.create(text="new", author=self.user, group=self.group)
+        group = reverse("group_posts", kwargs={"slug": self.group.slug})
+        self.get(group)
+        post.group = self.other
+        post.save()
+        self.assertEqual(self.get(group), "MISS")
+
+    def test_generation_changes_only_after_commit(self):
+        index = reverse("index")
+        feed = page_cache.index_feed()
+        self.get(index)
+        generation = page_cache.generation(feed)
+        with transaction.atomic():
+            Post.objects.create(text="new", author=self.user)
+            # Читатель, который ещё не видит пост, остаётся на старом
+            # поколении и не может сохранить старую страницу под новым.
+            self.assertEqual(page_cache.generation(feed), generation)
+        self.assertNotEqual(page_cache.generation(feed), generation)
+        self.assertEqual(self.get(index), "MISS")
+
+    def test_rolled_back_write_keeps_generation(self):
+        feed = page_cache.index_feed()
+        generation = page_cache.generation(feed)
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            Post.objects.create(text="new", author=self.user)
+            raise RuntimeError
+        self.assertEqual(page_cache.generation(feed), generation)
+
+
+class TestStampedeProtection(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_concurrent_misses_compute_once(self):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return 42
+
+        results = []
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(
+                    get_or_set("answer", compute, 60, poll=0.01)
+                )
+            )
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, [42] * 5)
+        self.assertEqual(len(calls), 1)
+
+    def test_expired_lock_of_another_caller_is_kept(self):
+        def compute():
+            # Блокировка истекла, и её взял другой процесс.
+            cache.set("answer:lock", "other", 10)
+            return 42
+
+        self.assertEqual(get_or_set("answer", compute, 60), 42)
+        self.assertEqual(cache.get("answer:lock"), "other")
+        self.assertEqual(get_or_set("fresh", lambda: 1, 60), 1)
+        self.assertIsNone(cache.get("fresh:lock"))
+
+    def test_value_is_recomputed_early_near_expiry(self):
+        get_or_set("answer", lambda: 1, 60)
+        value, delta, expiry = cache.get("answer")
+        cache.set("answer", (value, 10.0, time.time() + 0.001), 60)
+        self.assertEqual(get_or_set("answer", lambda: 2, 60), 2)
+
+
+class TestSearch(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username="oleg",
+            email="oleg@skynet.com",
+            password="12345678"
+        )
+        self.cats = Post.objects.create(
+            text="Мои коты спят весь день", author=self.user
+        )
+        self.dogs = Post.objects.create(
+            text="Собака гуляет во дворе", author=self.user
+        )
+
+    def search(self, query):
+        response = self.client.get(reverse("search"), {"q": query})
+        return list(response.context["page"])
+
+    def test_search_matches_word_forms(self):
+        self.assertEqual(self.search("котов"), [self.cats])
+        self.assertEqual(self.search("собаки"), [self.dogs])
+        self.assertEqual(self.search("кот собака"), [])
+
+    def test_search_does_not_match_other_words_by_prefix(self):
+        Post.objects.create(text="Человек, который смеётся", author=self.user)
+        Post.objects.create(text="Котлеты на ужин", author=self.user)
+        self.assertEqual(self.search("кот"), [self.cats])
+
+    def test_index_follows_edits_and_deletes(self):
+        self.cats.text = "Собаки лают"
+        self.cats.save()
+        self.assertEqual(set(self.search("собака")), {self.cats, self.dogs})
+        self.dogs.delete()
+        self.assertEqual(self.search("собака"), [self.cats])
+
+    def test_rebuild_command_indexes_all_posts(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {search.FTS_TABLE}")
+        self.assertEqual(self.search("кот"), [])
+        call_command("rebuild_search_index", stdout=StringIO())
+        self.assertEqual(self.search("кот"), [self.cats])
+
+
+
+class TestConditionalGet(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="kyle", password="12345678")
+        self.reader = User.objects.create_user(username="john", password="12345678")
+        self.post = Post.objects.create(text="text", author=self.user)
+
+    def revalidate(self, url, client=None):
+        client = client or self.client
+        etag = client.get(url)["ETag"]
+        return client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_unchanged_feed_is_not_rendered_again(self):
+        url = reverse("index")
+        etag = self.client.get(url)["ETag"]
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        Post.objects.create(text="new", author=self.user)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_last_modified_only_for_anonymous(self):
+        url = reverse("profile", args=[self.user.username])
+        last_modified = self.client.get(url)["Last-Modified"]
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+        self.client.force_login(self.reader)
+        response = self.client.get(url)
+        self.assertFalse(response.has_header("Last-Modified"))
+        self.assertTrue(response.has_header("ETag"))
+
+    def test_etag_differs_between_users(self):
+        url = reverse("index")
+        anonymous = self.client.get(url)["ETag"]
+        self.client.force_login(self.reader)
+        self.assertNotEqual(self.client.get(url)["ETag"], anonymous)
+
+    def test_profile_changes_with_followers(self):
+        url = reverse("profile", args=[self.user.username])
+        self.assertEqual(self.revalidate(url).status_code, 304)
+        etag = self.client.get(url)["ETag"]
+        Follow.objects.create(user=self.reader, author=self.user)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_post_page_changes_with_comments(self):
+        url = reverse("post", args=[self.user.username, self.post.pk])
+        etag = self.client.get(url)["ETag"]
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        Comment.objects.create(post=self.post, author=self.reader, text="hi")
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_etag_changes_only_after_commit(self):
+        url = reverse("index")
+        etag = self.client.get(url)["ETag"]
+        with transaction.atomic():
+            Post.objects.create(text="new", author=self.user)
+            # Клиент, получивший ETag сейчас, запомнил бы страницу без поста.
+            self.assertEqual(self.client.get(url)["ETag"], etag)
+        self.assertNotEqual(self.client.get(url)["ETag"], etag)
+
+
+class TestApi(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username="marcus", password="12345678")
+        self.reader = User.objects.create_user(username="blair", password="12345678")
+        self.group = Group.objects.create(
+            title="Resistance", slug="resistance", description="2018"
+        )
+        self.posts = [
+            Post.objects.create(
+                text=f"post {number}", author=self.author, group=self.group
+            )
+            for number in range(12)
+        ]
+
+    def get(self, url, **params):
+        response = self.client.get(url, params)
+        return response.status_code, response.json()
+
+    def test_feed_pages_by_cursor(self):
+        status, data = self.get(reverse("api_index"))
+        self.assertEqual(status, 200)
+        self.assertEqual(
+            [item["id"] for item in data["results"]],
+            [post.pk for post in reversed(self.posts[2:])],
+        )
+        self.assertIsNone(data["previous"])
+        response = self.client.get(data["next"])
+        self.assertEqual(
+            [item["id"] for item in response.json()["results"]],
+            [self.posts[1].pk, self.posts[0].pk],
+        )
+        self.assertIsNone(response.json()["next"])
+
+    def test_sparse_fields_and_bulk_fetch(self):
+        ids = f"{self.posts[3].pk},{self.posts[1].pk},999"
+        with self.assertNumQueries(1):
+            status, data = self.get(
+                reverse("api_index"), ids=ids, fields="id,author"
+            )
+        self.assertEqual(data["results"], [
+            {"id": self.posts[3].pk, "author": "marcus"},
+            {"id": self.posts[1].pk, "author": "marcus"},
+        ])
+        status, data = self.get(reverse("api_index"), fields="id,secret")
+        self.assertEqual(status, 400)
+        status, data = self.get(
+            reverse("api_index"), ids=f"{self.posts[0].pk},{2 ** 64}"
+        )
+        self.assertEqual(status, 400)
+
+    def test_group_profile_and_post(self):
+        status, data = self.get(
+            reverse("api_group_posts", args=["resistance"]), fields="group"
+        )
+        self.assertEqual(data["results"][0], {"group": "resistance"})
+        status, data = self.get(reverse("api_profile", args=["marcus"]))
+        self.assertEqual(data["posts_count"], 12)
+        status, data = self.get(reverse("api_post", args=[self.posts[0].pk]))
+        self.assertEqual(data["text"], "post 0")
+        self.assertIsNone(data["image"])
+        status, data = self.get(reverse("api_post", args=[0]))
+        self.assertEqual(status, 404)
+
+    def test_comments_and_follows_require_login(self):
+        url = reverse("api_comments", args=[self.posts[0].pk])
+        self.assertEqual(self.client.post(url, {"text": "hi"}).status_code, 401)
+
+        self.client.force_login(self.reader)
+        response = self.client.post(
+            url, {"text": "hi"}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["author"], "blair")
+        status, data = self.get(url)
+        self.assertEqual([item["text"] for item in data["results"]], ["hi"])
+
+        follow_url = reverse("api_follow", args=["marcus"])
+        self.assertEqual(self.client.post(follow_url).status_code, 201)
+        self.assertEqual(self.client.post(follow_url).status_code, 200)
+        status, data = self.get(reverse("api_profile", args=["marcus"]))
+        self.assertTrue(data["following"])
+        self.assertEqual(self.client.delete(follow_url).status_code, 204)
+        self.assertFalse(Follow.objects.exists())
+
+
+
+class TestBulkFollow(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.reader = User.objects.create_user(username="kate", password="12345678")
+        self.authors = [
+            User.objects.create_user(username=f"author{number}")
+            for number in range(5)
+        ]
+        for author in self.authors:
+            Post.objects.create(text=f"by {author.username}", author=author)
+        Follow.objects.create(user=self.reader, author=self.authors[0])
+        self.client.force_login(self.reader)
+        self.url = reverse("api_bulk_follow")
+
+    def send(self, method, usernames):
+        response = getattr(self.client, method)(
+            self.url, {"usernames": usernames}, content_type="application/json"
+        )
+        return {item["username"]: item["status"] for item in response.json()["results"]}
+
+    def test_follows_many_authors_at_once(self):
+        names = [author.username for author in self.authors]
+        with self.assertNumQueries(15):
+            results = self.send("post", names + ["ghost", "kate", "author1"])
+        self.assertEqual(results, {
+            "author0": "already_following",
+            "author1": "followed",
+            "author2": "followed",
+            "author3": "followed",
+            "author4": "followed",
+            "ghost": "not_found",
+            "kate": "self",
+        })
+        self.assertEqual(Follow.objects.filter(user=self.reader).count(), 5)
+        self.assertEqual(user_stats(self.reader).following_count, 5)
+        self.assertEqual(
+            [user_stats(author).followers_count for author in self.authors],
+            [1, 1, 1, 1, 1],
+        )
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 5
+        )
+
+    def test_racing_follow_is_not_counted_twice(self):
+        insert_follows = follows.insert_follows
+
+        def racing_insert(user_id, author_ids):
+            # Другой запрос успел подписать на author1 после проверки.
+            Follow.objects.create(user=self.reader, author=self.authors[1])
+            return insert_follows(user_id, author_ids)
+
+        with mock.patch.object(follows, "insert_follows", racing_insert):
+            self.send("post", ["author1", "author2"])
+        self.assertEqual(Follow.objects.filter(user=self.reader).count(), 3)
+        self.assertEqual(user_stats(self.reader).following_count, 3)
+        self.assertEqual(user_stats(self.authors[1]).followers_count, 1)
+        self.assertEqual(user_stats(self.authors[2]).followers_count, 1)
+
+    def test_follows_are_written_in_batches(self):
+        names = [author.username for author in self.authors]
+        with mock.patch.object(connection.ops, "bulk_batch_size", return_value=2), \
+                CaptureQueriesContext(connection) as queries:
+            followed = self.send("post", names)
+            unfollowed = self.send("delete", names)
+        writes = [
+            query["sql"].split()[0]
+            for query in queries.captured_queries
+            if '"posts_follow" (' in query["sql"]
+            or query["sql"].startswith('DELETE FROM "posts_follow"')
+        ]
+        self.assertEqual(writes, ["INSERT", "INSERT", "DELETE", "DELETE", "DELETE"])
+        self.assertEqual(list(followed.values()).count("followed"), 4)
+        self.assertEqual(set(unfollowed.values()), {"unfollowed"})
+        self.assertFalse(Follow.objects.exists())
+        self.assertEqual(
+            [user_stats(author).followers_count for author in self.authors],
+            [0, 0, 0, 0, 0],
+        )
+
+    def test_follow_pairs_are_unique(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Follow.objects.bulk_create(
+                [Follow(user=self.reader, author=self.authors[0])]
+            )
+
+    def test_unfollows_many_authors_at_once(self):
+        for author in self.authors[1:]:
+            Follow.objects.create(user=self.reader, author=author)
+        names = [author.username for author in self.authors]
+        with self.assertNumQueries(11):
+            results = self.send("delete", names)
+        self.assertEqual(set(results.values()), {"unfollowed"})
+        self.assertEqual(user_stats(self.reader).following_count, 0)
+        self.assertEqual(
+            [user_stats(author).followers_count for author in self.authors],
+            [0, 0, 0, 0, 0],
+        )
+        self.assertFalse(TimelineEntry.objects.filter(user=self.reader).exists())
+
+    def test_unfollow_statuses(self):
+        results = self.send("delete", ["author0", "author1", "ghost"])
+        self.assertEqual(results, {
+            "author0": "unfollowed",
+            "author1": "not_following",
+            "ghost": "not_found",
+        })
+        self.assertFalse(Follow.objects.exists())
+        self.assertEqual(user_stats(self.authors[0]).followers_count, 0)
+
+    def test_rejects_bad_payload(self):
+        response = self.client.post(
+            self.url, {"usernames": "author1"}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+
+class TestCommentPages(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username="grace", password="12345678")
+        self.post = Post.objects.create(text="viral", author=self.author)
+        Comment.objects.bulk_create([
+            Comment(post=self.post, author=self.author, text=f"comment {number}")
+            for number in range(55)
+        ])
+
+    def test_post_page_shows_first_chunk(self):
+        response = self.client.get(
+            reverse("post", args=[self.author.username, self.post.pk])
+        )
+        page = response.context["comment_page"]
+        self.assertEqual(len(page), 50)
+        self.assertEqual(page[0].text, "comment 0")
+        self.assertContains(response, "js-more-comments")
+
+    def test_next_chunk_is_one_query_fragment(self):
+        response = self.client.get(
+            reverse("post", args=[self.author.username, self.post.pk])
+        )
+        cursor = response.context["comment_page"].next_cursor
+        url = reverse("post_comments", args=[self.author.username, self.post.pk])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {"after": cursor})
+        comment_queries = [
+            query for query in queries if 'FROM "posts_comment"' in query["sql"]
+        ]
+        self.assertEqual(len(comment_queries), 1)
+        self.assertTemplateUsed(response, "includes/comment_list.html")
+        self.assertTemplateNotUsed(response, "base.html")
+        texts = [comment.text for comment in response.context["comment_page"]]
+        self.assertEqual(texts, [f"comment {number}" for number in range(50, 55)])
+        self.assertNotContains(response, "js-more-comments")
+
+
+def image_upload(name="image.png", size=(50, 50)):
+    buffer = BytesIO()
+    Image.new("RGB", size, (255, 0, 0)).save(buffer, "png")
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/png")
+
+
+class MediaRootMixin:
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, True)
+        cache.clear()
+
+
+@override_settings(THUMBNAIL_ASYNC=False)
+class TestCommentWrites(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username="ada", password="12345678")
+        self.reader = User.objects.create_user(username="bob", password="12345678")
+        self.post = Post.objects.create(text="text", author=self.author)
+        self.url = reverse("add_comment", args=[self.author.username, self.post.pk])
+        self.client.force_login(self.reader)
+
+    def test_post_is_checked_with_one_query(self):
+        self.client.get(reverse("index"))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, {"text": "hi"})
+        self.assertEqual(response.status_code, 302)
+        sql = [query["sql"] for query in queries]
+        insert = next(
+            number for number, query in enumerate(sql)
+            if query.startswith('INSERT INTO "posts_comment"')
+        )
+        lookups = [query for query in sql[:insert] if "posts_post" in query]
+        self.assertEqual(len(lookups), 1)
+        self.assertIn('"auth_user"."username"', lookups[0])
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+
+    def test_missing_post_is_404(self):
+        request = RequestFactory().post("/", {"text": "hi"})
+        request.user = self.reader
+        with self.assertRaises(Http404):
+            views.add_comment(request, self.reader.username, self.post.pk)
+        self.assertFalse(Comment.objects.exists())
+
+    def test_failed_write_keeps_the_form(self):
+        error = comment_writes.CommentWriteError("Комментарий не записан вовремя")
+        with mock.patch.object(comment_writes, "add", side_effect=error):
+            response = self.client.post(self.url, {"text": "hi"})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context["form"].non_field_errors())
+        self.assertContains(response, "Не удалось сохранить комментарий")
+        self.assertEqual(response.context["form"]["text"].value(), "hi")
+        self.assertEqual(response.context["posts_sum"], 1)
+        self.assertEqual(response.context["stats"], user_stats(self.author))
+
+    def test_bad_comment_does_not_fail_its_batch(self):
+        missing = Post.objects.create(text="gone", author=self.author)
+        missing_id = missing.pk
+        missing.delete()
+        batch = [
+            comment_writes.PendingComment(self.post.pk, self.reader.pk, "one"),
+            comment_writes.PendingComment(missing_id, self.reader.pk, "two"),
+            comment_writes.PendingComment(self.post.pk, self.author.pk, "three"),
+        ]
+        with self.assertLogs(comment_writes.logger, "WARNING"):
+            comment_writes._write_batch(batch)
+        self.assertEqual(
+            [pending.error is None for pending in batch], [True, False, True]
+        )
+        self.assertTrue(all(pending.done.is_set() for pending in batch))
+        self.assertEqual(
+            sorted(Comment.objects.values_list("text", flat=True)),
+            ["one", "three"],
+        )
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 2)
+
+    def test_batch_updates_counters_and_feeds(self):
+        other = Post.objects.create(text="other", author=self.reader)
+        generation = page_cache.generation(page_cache.profile_feed("ada"))
+        comment_writes.write_many([
+            Comment(post=self.post, author=self.reader, text="one"),
+            Comment(post=self.post, author=self.reader, text="two"),
+            Comment(post=other, author=self.author, text="three"),
+        ])
+        self.post.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 2)
+        self.assertEqual(other.comment_count, 1)
+        self.assertGreater(
+            page_cache.generation(page_cache.profile_feed("ada")), generation
+        )
+
+    @override_settings(COMMENT_WRITE_MODE=comment_writes.BUFFERED)
+    def test_buffered_comments_are_written_in_one_batch(self):
+        with mock.patch.object(comment_writes, "shares_memory_db", return_value=False), \
+                mock.patch.object(comment_writes, "writer"):
+            for number in range(3):
+                self.client.post(self.url, {"text": f"comment {number}"})
+            self.assertFalse(Comment.objects.exists())
+            with CaptureQueriesContext(connection) as queries:
+                comment_writes.flush()
+        inserts = [
+            query for query in queries
+            if query["sql"].startswith('INSERT INTO "posts_comment"')
+        ]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(Comment.objects.count(), 3)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 3)
+
+
+class TestSqliteTuning(TestCase):
+    def test_pragmas_are_applied_to_connections(self):
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], 5000)
+            cursor.execute("PRAGMA temp_store")
+            self.assertEqual(cursor.fetchone()[0], 2)
+            cursor.execute("PRAGMA synchronous")
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+    def test_reads_and_writes_run_side_by_side(self):
+        stats, _ = run_load_test(writers=4, readers=4, writes=25, reads=100)
+        self.assertEqual(stats.errors, [])
+        self.assertEqual(stats.writes, 100)
+        self.assertEqual(stats.reads, 400)
+        self.assertGreater(stats.reads_during_writes, 0)
+
+    def test_deferred_transactions_hit_locks(self):
+        stats, _ = run_load_test(
+            writers=4, readers=0, writes=25, TRANSACTION_MODE=None
+        )
+        self.assertTrue(stats.errors)
+        self.assertIn("database is locked", stats.errors[0])
+
+
+class TestTemplatePrecompile(TestCase):
+    def test_all_templates_parse(self):
+        count, errors = precompile.precompile()
+        self.assertEqual(errors, [])
+        self.assertGreater(count, 10)
+
+    def test_compile_templates_command_fails_on_broken_template(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        with open(os.path.join(directory, "broken.html"), "w") as broken:
+            broken.write("{% if %}")
+        templates = [dict(settings.TEMPLATES[0], DIRS=[directory])]
+        with self.settings(TEMPLATES=templates):
+            with self.assertRaises(CommandError):
+                call_command("compile_templates", stderr=StringIO())
+
+    def test_cached_loader_keeps_parsed_templates(self):
+        options = dict(
+            settings.TEMPLATES[0]["OPTIONS"],
+            loaders=[(
+                "django.template.loaders.cached.Loader",
+                settings.TEMPLATE_LOADERS,
+            )],
+        )
+        templates = [dict(settings.TEMPLATES[0], OPTIONS=options)]
+        with self.settings(TEMPLATES=templates):
+            count, _ = precompile.precompile()
+            loader = engines["django"].engine.template_loaders[0]
+            self.assertTrue(precompile.is_cached())
+            self.assertEqual(len(loader.get_template_cache), count)
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class TestConnectionReuse(TestCase):
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.wrapper = connections["default"].__class__(
+            dict(connection.settings_dict, NAME=os.path.join(directory, "db")),
+            alias="reuse",
+        )
+        self.addCleanup(self.wrapper.close)
+        db_connections.flush()
+        db_connections.reset("reuse")
+
+    def test_connection_is_reused_between_requests(self):
+        self.wrapper.ensure_connection()
+        raw = self.wrapper.connection
+        self.wrapper.close_if_unusable_or_obsolete()
+        self.wrapper.ensure_connection()
+        self.assertIs(self.wrapper.connection, raw)
+        stats = db_connections.stats("reuse")
+        self.assertEqual((stats["opened"], stats["reused"]), (1, 1))
+        self.assertEqual(
+            sum(stats[name] for name in db_connections.bucket_names()), 1
+        )
+
+    def test_broken_connection_is_replaced(self):
+        self.wrapper.ensure_connection()
+        raw = self.wrapper.connection
+        self.wrapper.close_if_unusable_or_obsolete()
+        with mock.patch.object(self.wrapper, "is_usable", return_value=False):
+            self.wrapper.ensure_connection()
+        self.assertIsNot(self.wrapper.connection, raw)
+        stats = db_connections.stats("reuse")
+        self.assertEqual(stats["health_check_failures"], 1)
+        self.assertEqual(stats["opened"], 2)
+
+    def test_metrics_reach_the_cache_in_batches(self):
+        with mock.patch.object(cache, "incr", wraps=cache.incr) as incr:
+            for _ in range(5):
+                db_connections.record("reuse", "reused")
+            incr.assert_not_called()
+            self.assertEqual(db_connections.stats("reuse")["reused"], 5)
+        incr.assert_called_once()
+
+    def test_pool_limits_and_reuses_connections(self):
+        pool = db_connections.ConnectionPool(
+            FakeConnection, lambda conn: not conn.closed, max_size=2, timeout=0.01
+        )
+        first, second = pool.get(), pool.get()
+        with self.assertRaises(db_connections.PoolTimeout):
+            pool.get()
+        pool.put(second)
+        self.assertIs(pool.get(), second)
+        first.closed = True
+        pool.put(first)
+        self.assertEqual(pool.idle, [])
+
+    def test_pool_closes_idle_connections(self):
+        pool = db_connections.ConnectionPool(
+            FakeConnection, lambda conn: True, min_size=1, idle_timeout=60
+        )
+        extra = pool.get()
+        warm = pool.get()
+        pool.put(extra)
+        pool.put(warm)
+        with mock.patch("time.monotonic", return_value=time.monotonic() + 120):
+            pool.prune()
+        self.assertEqual([conn for _, conn in pool.idle], [warm])
+        self.assertTrue(extra.closed)
+
+
+@override_settings(DATABASE_REPLICAS=["replica"])
+class TestReplicaRouting(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="ada", password="12345678")
+        self.post = Post.objects.create(text="text", author=self.user)
+
+        @replicas.replica_reads(lambda: page_cache.index_feed())
+        def view(request):
+            return {
+                "read": router.db_for_read(Post),
+                "write": router.db_for_write(Post),
+            }
+        self.view = view
+
+    def get(self, **cookies):
+        request = RequestFactory().get("/")
+        request.COOKIES.update(cookies)
+        return self.view(request)
+
+    def test_feed_reads_go_to_replica(self):
+        page_cache.generation(page_cache.index_feed())
+        with mock.patch("time.time", return_value=time.time() + 60):
+            self.assertEqual(self.get(), {"read": "replica", "write": "default"})
+        self.assertEqual(router.db_for_read(Post), "default")
+
+    def test_recently_changed_feed_is_read_from_primary(self):
+        with mock.patch("time.time", return_value=time.time() - 60):
+            page_cache.generation(page_cache.index_feed())
+        self.assertEqual(self.get()["read"], "replica")
+        page_cache.invalidate(page_cache.index_feed())
+        self.assertEqual(self.get()["read"], "default")
+
+    def test_client_sticks_to_primary_after_write(self):
+        self.client.force_login(self.user)
+        response = self.client.post(
+            reverse("add_comment", args=[self.user.username, self.post.pk]),
+            {"text": "hi"},
+        )
+        cookie = response.cookies[replicas.STICKY_COOKIE]
+        self.assertEqual(cookie["max-age"], settings.REPLICA_STICKY_SECONDS)
+        page_cache.generation(page_cache.index_feed())
+        with mock.patch("time.time", return_value=time.time() + 60):
+            self.assertEqual(
+                self.get(**{replicas.STICKY_COOKIE: "1"})["read"], "default"
+            )
+
+    def test_reads_without_replicas_use_default(self):
+        with self.settings(DATABASE_REPLICAS=[]):
+            self.assertEqual(self.get()["read"], "default")
+            response = self.client.get(reverse("index"))
+        self.assertNotIn(replicas.STICKY_COOKIE, response.cookies)
+
+
+class TestSyndication(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username="ada", password="12345678")
+        self.group = Group.objects.create(title="Cats", slug="cats")
+        self.post = Post.objects.create(
+            text="Первая строка\nпродолжение", author=self.author, group=self.group
+        )
+
+    def test_atom_and_json_feeds(self):
+        response = self.client.get(reverse("site_feed", args=["atom"]))
+        self.assertEqual(response["Content-Type"], feeds.CONTENT_TYPES["atom"])
+        self.assertContains(response, "<title>Первая строка</title>")
+        self.assertContains(response, "<entry>", count=1)
+
+        response = self.client.get(
+            reverse("group_feed", args=[self.group.slug, "json"])
+        )
+        data = response.json()
+        self.assertEqual(data["title"], "Yatube: Cats")
+        self.assertEqual(data["items"][0]["tags"], ["Cats"])
+        self.assertTrue(data["items"][0]["url"].endswith(
+            reverse("post", args=[self.author.username, self.post.pk])
+        ))
+
+        response = self.client.get(
+            reverse("author_feed", args=[self.author.username, "json"])
+        )
+        self.assertEqual(len(response.json()["items"]), 1)
+
+    def test_unknown_format_or_author_is_404(self):
+        request = RequestFactory().get("/")
+        request.user = self.author
+        with self.assertRaises(Http404):
+            feeds.site_feed(request, fmt="rss2")
+        with self.assertRaises(Http404):
+            feeds.author_feed(request, username="nobody", fmt="atom")
+
+    def test_poll_is_answered_with_304(self):
+        url = reverse("author_feed", args=[self.author.username, "atom"])
+        etag = self.client.get(url)["ETag"]
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        Post.objects.create(text="new", author=self.author)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_new_post_renders_only_its_entry(self):
+        url = reverse("site_feed", args=["json"])
+        self.client.get(url)
+        Post.objects.create(text="new", author=self.author)
+        render_entry = mock.Mock(wraps=feeds.json_entry)
+        with mock.patch.dict(
+            feeds.BUILDERS, json=(render_entry, feeds.json_document)
+        ):
+            response = self.client.get(url)
+        self.assertEqual(len(response.json()["items"]), 2)
+        self.assertEqual(render_entry.call_count, 1)
+
+
+class TestThumbnailQueue(MediaRootMixin, TransactionTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="enrique", password="12345678")
+
+    def feed_images(self, post):
+        post.refresh_from_db()
+        thumbnails.attach_feed_images([post])
+        return post.feed_images
+
+    def test_feed_shows_placeholder_without_touching_pillow(self):
+        with mock.patch("posts.thumbnails.enqueue"):
+            post = Post.objects.create(
+                text="text", author=self.user, image=image_upload()
+            )
+        with mock.patch.object(default.engine, "get_image") as get_image:
+            response = self.client.get(reverse("index"))
+        get_image.assert_not_called()
+        self.assertContains(response, "Картинка готовится")
+        self.assertEqual(self.feed_images(post), {"default": None, "webp": None})
+
+    def test_upload_prepares_all_variants(self):
+        post = Post.objects.create(
+            text="text", author=self.user, image=image_upload()
+        )
+        images = self.feed_images(post)
+        self.assertTrue(images["webp"].name.endswith(".webp"))
+        for image in images.values():
+            self.assertTrue(default.storage.exists(image.name))
+        response = self.client.get(reverse("index"))
+        self.assertContains(response, 'type="image/webp"')
+
+    def test_names_match_sorl_thumbnails(self):
+        # Сломается, если sorl перестанет отдавать имя и файл через get_thumbnail
+        # или начнёт называть ту же миниатюру иначе.
+        with mock.patch("posts.thumbnails.enqueue"):
+            post = Post.objects.create(
+                text="text", author=self.user, image=image_upload()
+            )
+        names = thumbnails.generate(post.image.name)
+        self.assertEqual(sorted(names), sorted(thumbnails.variant_keys()))
+        geometry, options = thumbnails.FEED_IMAGE
+        for name, (size, variant_options) in thumbnails.variants(
+            geometry, options
+        ).items():
+            thumbnail = get_thumbnail(post.image.name, size, **variant_options)
+            self.assertEqual(
+                names[thumbnails.variant_key(geometry, name)], thumbnail.name
+            )
+            self.assertEqual(thumbnail.width, 960)
+
+    def test_replaced_image_forgets_thumbnails(self):
+        post = Post.objects.create(
+            text="text", author=self.user, image=image_upload()
+        )
+        self.assertTrue(self.feed_images(post)["default"])
+        self.client.force_login(self.user)
+        with mock.patch("posts.thumbnails.enqueue"):
+            self.client.post(
+                reverse("post_edit", args=[self.user.username, post.pk]),
+                {
+                    "text": "text",
+                    "image": image_upload(name="other.png", size=(60, 60)),
+                },
+            )
+        self.assertIsNone(self.feed_images(post)["default"])
+        response = Client().get(reverse("index"))
+        self.assertContains(response, "Картинка готовится")
+
+    def test_feed_does_not_query_thumbnail_store(self):
+        for number in range(3):
+            Post.objects.create(
+                text=f"text {number}", author=self.user, image=image_upload()
+            )
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("index"))
+        kvstore_queries = [
+            query for query in queries if "thumbnail_kvstore" in query["sql"]
+        ]
+        self.assertEqual(kvstore_queries, [])
+        self.assertContains(response, 'type="image/webp"', count=3)
+
+    def test_pregenerate_command_is_resumable(self):
+        with mock.patch("posts.thumbnails.enqueue"):
+            first, second = [
+                Post.objects.create(
+                    text="text", author=self.user, image=image_upload(size=size)
+                )
+                for size in [(50, 50), (60, 60)]
+            ]
+        out = StringIO()
+        call_command(
+            "pregenerate_thumbnails", workers=0, after_id=first.pk, stdout=out
+        )
+        self.assertIn("подготовлено: 1", out.getvalue())
+        self.assertIsNone(self.feed_images(first)["default"])
+        self.assertIsNotNone(self.feed_images(second)["default"])
+        out = StringIO()
+        call_command("pregenerate_thumbnails", workers=0, stdout=out)
+        self.assertIn("Уже готовы: 1, подготовлено: 1", out.getvalue())
+        for image in self.feed_images(first).values():
+            self.assertIsNotNone(image)
+
+
+class TestStreamingUpload(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username="ramona", password="12345678")
+        self.client.force_login(self.user)
+
+    def temp_files(self):
+        directory = os.path.join(self.media_root, settings.IMAGE_UPLOAD_TEMP_DIR)
+        return os.listdir(directory) if os.path.isdir(directory) else []
+
+    def post(self, size=(50, 50)):
+        return self.client.post(
+            reverse("new"), {"text": "text", "image": image_upload(size=size)}
+        )
+
+    def test_upload_is_moved_into_media_root(self):
+        with mock.patch("posts.thumbnails.enqueue"):
+            self.post()
+        post = Post.objects.get()
+        self.assertTrue(post.image.name.startswith("posts/"))
+        self.assertTrue(os.path.exists(post.image.path))
+        self.assertEqual(self.temp_files(), [])
+
+    def test_streamed_upload_is_not_copied_again(self):
+        with mock.patch("posts.thumbnails.enqueue"), \
+                mock.patch("posts.storage.tempfile") as storage_tempfile:
+            self.post()
+        storage_tempfile.mkstemp.assert_not_called()
+        post = Post.objects.get()
+        with open(post.image.path, "rb") as stored:
+            self.assertEqual(stored.read(), image_upload().read())
+        self.assertEqual(self.temp_files(), [])
+
+    @override_settings(IMAGE_UPLOAD_MAX_SIZE=100)
+    def test_oversized_upload_is_rejected(self):
+        response = self.post()
+        self.assertFalse(Post.objects.exists())
+        self.assertEqual(
+            response.context["form"].errors["image"], ["Файл больше 100\xa0байт"]
+        )
+        self.assertEqual(self.temp_files(), [])
+
+    def test_csrf_is_still_checked(self):
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.user)
+        response = client.post(reverse("new"), {"text": "text"})
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(IMAGE_UPLOAD_MAX_PIXELS=1000)
+    def test_large_dimensions_are_rejected_from_header(self):
+        response = self.post(size=(40, 30))
+        self.assertFalse(Post.objects.exists())
+        self.assertEqual(
+            response.context["form"].errors["image"],
+            ["Картинка слишком большая по размерам"],
+        )
+        self.assertEqual(self.temp_files(), [])
+
+    def test_identical_uploads_share_one_file(self):
+        with mock.patch("posts.thumbnails.enqueue"):
+            self.post()
+            self.post()
+            self.post(size=(60, 60))
+        first, second, other = Post.objects.order_by("pk")
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertNotEqual(first.image.name, other.image.name)
+        digest = os.path.splitext(os.path.basename(first.image.name))[0]
+        self.assertEqual(
+            first.image.name, f"posts/{digest[:2]}/{digest[2:4]}/{digest}.png"
+        )
+        stored = [
+            name
+            for _, _, files in os.walk(os.path.join(self.media_root, "posts"))
+            for name in files
+        ]
+        self.assertEqual(len(stored), 2)
+
+    def test_racing_saves_keep_one_file(self):
+        storage = Post._meta.get_field("image").storage
+        content = image_upload().read()
+        names = []
+        # Оба сохранения успели проверить exists() до записи.
+        with mock.patch.object(storage, "exists", return_value=False):
+            for _ in range(2):
+                upload = SimpleUploadedFile("x.png", content)
+                names.append(storage.save("posts/image.png", upload))
+        self.assertEqual(names[0], names[1])
+        directory = os.path.dirname(storage.path(names[0]))
+        self.assertEqual(os.listdir(directory), [os.path.basename(names[0])])
+        with storage.open(names[0]) as stored:
+            self.assertEqual(stored.read(), content)
+
+
+class TestMediaServing(MediaRootMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.content = bytes(range(256)) * 4
+        self.digest = hashlib.sha256(self.content).hexdigest()
+        self.name = f"posts/{self.digest}.png"
+        self.write(self.name, self.content)
+        self.url = f"{settings.MEDIA_URL}{self.name}"
+
+    def write(self, name, content):
+        path = os.path.join(self.media_root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as file:
+            file.write(content)
+
+    def body(self, response):
+        content = b"".join(response.streaming_content)
+        response.close()
+        return content
+
+    def test_hashed_file_is_immutable(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.body(response), self.content)
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertTrue(response.has_header("ETag"))
+
+    def test_other_files_are_revalidated(self):
+        self.write("logo.png", self.content)
+        response = self.client.get(f"{settings.MEDIA_URL}logo.png")
+        self.body(response)
+        self.assertIn("no-cache", response["Cache-Control"])
+
+    def test_conditional_get(self):
+        etag = self.client.get(self.url)["ETag"]
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_range_request(self):
+        response = self.client.get(self.url, HTTP_RANGE="bytes=10-19")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], "bytes 10-19/1024")
+        self.assertEqual(self.body(response), self.content[10:20])
+
+        response = self.client.get(self.url, HTTP_RANGE="bytes=-4")
+        self.assertEqual(self.body(response), self.content[-4:])
+
+        response = self.client.get(self.url, HTTP_RANGE="bytes=2000-")
+        self.assertEqual(response.status_code, 416)
+
+    def test_stale_if_range_returns_whole_file(self):
+        response = self.client.get(
+            self.url, HTTP_RANGE="bytes=10-19", HTTP_IF_RANGE='"stale"'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.body(response), self.content)
+
+    @override_settings(SENDFILE_BACKEND="x-accel-redirect")
+    def test_accel_redirect_handoff(self):
+        response = self.client.get(self.url)
+        self.assertEqual(
+            response["X-Accel-Redirect"], f"/internal/media/{self.name}"
+        )
+        self.assertEqual(response.content, b"")
+
+    def test_unfinished_uploads_and_traversal_are_hidden(self):
+        self.write(f"{settings.IMAGE_UPLOAD_TEMP_DIR}/part.upload", b"data")
+        for path in [f"{settings.IMAGE_UPLOAD_TEMP_DIR}/part.upload",
+                     f"posts/../{settings.IMAGE_UPLOAD_TEMP_DIR}/part.upload",
+                     "../yatube/settings.py"]:
+            request = RequestFactory().get(f"{settings.MEDIA_URL}{path}")
+            with self.assertRaises(Http404, msg=path):
+                serving.serve_media(request, path)
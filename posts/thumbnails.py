@@ -0,0 +1,157 @@
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import connection, connections, transaction
+from django.db.models import F
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.images import ImageFile
+
+
+logger = logging.getLogger(__name__)
+
+# Размеры, которые выводят шаблоны; для каждого готовится ещё и WebP.
+FEED_IMAGE = ("960x339", {"crop": "center", "upscale": True})
+
+SIZES = [FEED_IMAGE]
+
+_executor = None
+
+
+def variants(geometry, options):
+    return {
+        "default": (geometry, dict(options)),
+        "webp": (geometry, dict(options, format="WEBP")),
+    }
+
+
+def variant_key(geometry, name):
+    return f"{geometry}:{name}"
+
+
+def variant_keys():
+    return [
+        variant_key(geometry, name)
+        for geometry, options in SIZES
+        for name in variants(geometry, options)
+    ]
+
+
+def stored_names(value):
+    """Имена готовых миниатюр по variant_key из значения Post.thumbnails."""
+    return json.loads(value) if value else {}
+
+
+def is_ready(names):
+    return all(key in names for key in variant_keys())
+
+
+def attach_feed_images(posts):
+    """Миниатюры ленты по именам, сохранённым в постах, без запросов к sorl."""
+    geometry = FEED_IMAGE[0]
+    for post in posts:
+        if not post.image:
+            continue
+        names = stored_names(post.thumbnails)
+        post.feed_images = {}
+        for name in variants(*FEED_IMAGE):
+            stored = names.get(variant_key(geometry, name))
+            post.feed_images[name] = (
+                ImageFile(stored, default.storage) if stored else None
+            )
+
+
+def generate(source_name):
+    """Готовит миниатюры всех размеров; возвращает их имена по variant_key.
+
+    Имена даёт публичный get_thumbnail sorl, поэтому их не нужно
+    вычислять заново, повторяя внутренние правила sorl.
+    """
+    names = {}
+    for geometry, options in SIZES:
+        for name, (size, variant_options) in variants(geometry, options).items():
+            thumbnail = get_thumbnail(source_name, size, **variant_options)
+            if not thumbnail.exists():
+                # sorl не бросает исключение, если не смог открыть исходник.
+                raise FileNotFoundError(thumbnail.name)
+            names[variant_key(geometry, name)] = thumbnail.name
+    return names
+
+
+def store(post_id, source_name, names):
+    """Сохраняет имена миниатюр в пост, если его картинка не сменилась.
+
+    Версия поста растёт, как в cards.bump, чтобы карточка перерисовалась.
+    """
+    from .models import Post
+
+    return Post.objects.filter(pk=post_id, image=source_name).update(
+        thumbnails=json.dumps(names), version=F("version") + 1
+    )
+
+
+def pregenerate(post_id, source_name):
+    """Готовит миниатюры в процессе команды; (post_id, source_name, имена).
+
+    При ошибке возвращает None.
+    """
+    try:
+        names = generate(source_name)
+    except Exception:
+        logger.exception("Не удалось подготовить миниатюры для %s", source_name)
+        return None
+    return post_id, source_name, names
+
+
+def _run(post_id, source_name):
+    from . import page_cache
+    from .models import Post
+
+    try:
+        store(post_id, source_name, generate(source_name))
+        page_cache.invalidate_posts(Post.objects.filter(pk=post_id))
+    except Exception:
+        logger.exception("Не удалось подготовить миниатюры для %s", source_name)
+
+
+def _run_in_worker(post_id, source_name):
+    try:
+        _run(post_id, source_name)
+    finally:
+        # Соединения потока-обработчика не закрываются обработчиком запроса.
+        connections.close_all()
+
+
+def executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.THUMBNAIL_WORKERS,
+            thread_name_prefix="thumbnails",
+        )
+    return _executor
+
+
+def shares_memory_db():
+    # Потоки не могут безопасно писать в общую in-memory базу SQLite.
+    return connection.vendor == "sqlite" and connection.is_in_memory_db()
+
+
+def enqueue(post):
+    """Ставит подготовку миниатюр в очередь после фиксации транзакции."""
+    if not post.image:
+        return
+    try:
+        if not post.image.storage.exists(post.image.name):
+            return
+    except SuspiciousFileOperation:
+        return
+    post_id, source_name = post.pk, post.image.name
+    if settings.THUMBNAIL_ASYNC and not shares_memory_db():
+        transaction.on_commit(
+            lambda: executor().submit(_run_in_worker, post_id, source_name)
+        )
+    else:
+        transaction.on_commit(lambda: _run(post_id, source_name))
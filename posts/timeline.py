@@ -0,0 +1,199 @@
+import heapq
+
+from django.conf import settings
+
+from .models import Post, Follow, TimelineEntry, UserStats
+from .paginator import CursorPaginator
+
+
+def is_fanout_author(author_id):
+    """Раскладывать ли новый пост автора по лентам подписчиков.
+
+    Автор, у которого подписчиков больше TIMELINE_FANOUT_LIMIT, навсегда
+    становится pull-автором: его посты собираются при чтении ленты.
+    Поэтому, когда подписчиков снова станет меньше, ленты не придётся
+    дополнять постами, которые не были разложены.
+    """
+    stats = (
+        UserStats.objects.filter(user_id=author_id)
+        .values_list("followers_count", "pull_timeline")
+        .first()
+    )
+    if stats is None:
+        return True
+    followers_count, pull_timeline = stats
+    if pull_timeline:
+        return False
+    if followers_count > settings.TIMELINE_FANOUT_LIMIT:
+        UserStats.objects.filter(user_id=author_id).update(pull_timeline=True)
+        return False
+    return True
+
+
+def pull_authors(user_id):
+    """Авторы из подписок пользователя, чьи посты собираются при чтении."""
+    followed = Follow.objects.filter(user_id=user_id).values("author")
+    return UserStats.objects.filter(
+        user__in=followed, pull_timeline=True
+    ).values_list("user", flat=True)
+
+
+def fan_out_post(post):
+    if post.author_id is None or not is_fanout_author(post.author_id):
+        return
+    followers = Follow.objects.filter(author_id=post.author_id).values_list(
+        "user_id", flat=True
+    )
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+            for user_id in followers.iterator()
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def backfill(user_id, author_id):
+    backfill_many(user_id, [author_id])
+
+
+def backfill_many(user_id, author_ids):
+    """Добавляет в ленту посты новых подписок одним запросом.
+
+    Лента обрезается до TIMELINE_LENGTH, поэтому достаточно стольких
+    последних постов всех авторов вместе.
+    """
+    pulled = UserStats.objects.filter(
+        user_id__in=author_ids, pull_timeline=True
+    ).values_list("user_id", flat=True)
+    author_ids = set(author_ids) - set(pulled)
+    if not author_ids:
+        return
+    posts = Post.objects.filter(author_id__in=author_ids).order_by(
+        "-pub_date", "-id"
+    )
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+            for post_id, pub_date in posts.values_list("id", "pub_date")[
+                :settings.TIMELINE_LENGTH
+            ]
+        ],
+        ignore_conflicts=True,
+    )
+    trim(user_id)
+
+
+def remove(user_id, author_id):
+    remove_many(user_id, [author_id])
+
+
+def remove_many(user_id, author_ids):
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id__in=author_ids
+    ).delete()
+
+
+def trim(user_id):
+    stale = TimelineEntry.objects.filter(user_id=user_id).order_by(
+        "-pub_date", "-post_id"
+    )[settings.TIMELINE_LENGTH:]
+    stale_ids = list(stale.values_list("id", flat=True))
+    TimelineEntry.objects.filter(id__in=stale_ids).delete()
+
+
+def rebuild(user):
+    TimelineEntry.objects.filter(user=user).delete()
+    for author_id in Follow.objects.filter(user=user).values_list(
+        "author_id", flat=True
+    ):
+        backfill(user.pk, author_id)
+
+
+class Timeline:
+    """Лента подписок пользователя, новые посты первыми.
+
+    Записи TimelineEntry и посты pull-авторов выбираются отдельными
+    запросами по индексам (user, -pub_date) и (author, -pub_date, -id),
+    каждый не дальше нужной страницы, и сливаются в памяти. Как и
+    TimelineEntry, лента ограничена TIMELINE_LENGTH постами.
+    Поддерживает count() и срезы, которые нужны Paginator.
+    """
+
+    def __init__(self, user_id, after=None, before=None):
+        self.user_id = user_id
+        self.after = after
+        self.before = before
+        self._pull_author_ids = None
+
+    def pull_author_ids(self):
+        if self._pull_author_ids is None:
+            self._pull_author_ids = list(pull_authors(self.user_id))
+        return self._pull_author_ids
+
+    def _window(self, queryset, tie, limit):
+        # Ключ (pub_date, id поста) и сравнение по курсору — как у CursorPaginator.
+        paginator = CursorPaginator(queryset, limit, key=("pub_date", tie))
+        if self.after:
+            queryset = paginator.after(*self.after)
+        elif self.before:
+            queryset = paginator.before(*self.before)
+        else:
+            queryset = paginator.queryset
+        return queryset.values_list("pub_date", tie)[:limit]
+
+    def entries(self, limit):
+        return self._window(
+            TimelineEntry.objects.filter(user_id=self.user_id), "post_id", limit
+        )
+
+    def pulled(self, limit, author_ids):
+        return self._window(
+            Post.objects.filter(author_id__in=author_ids), "id", limit
+        )
+
+    def posts(self, limit):
+        author_ids = self.pull_author_ids()
+        keys = heapq.merge(
+            self.entries(limit),
+            self.pulled(limit, author_ids) if author_ids else [],
+            reverse=not self.before,
+        )
+        # Пост мог попасть в ленту до того, как автор стал pull-автором.
+        post_ids = list(dict.fromkeys(post_id for _, post_id in keys))[:limit]
+        posts = Post.objects.for_feed().in_bulk(post_ids)
+        return [posts[post_id] for post_id in post_ids if post_id in posts]
+
+    def count(self):
+        total = TimelineEntry.objects.filter(user_id=self.user_id).count()
+        if total > settings.TIMELINE_LENGTH:
+            # fan_out_post не обрезает ленты подписчиков: в запросе на запись
+            # это стоило бы обхода лент всех подписчиков. Лента обрезается
+            # здесь, при чтении, по индексу (user, -pub_date).
+            trim(self.user_id)
+            total = settings.TIMELINE_LENGTH
+        author_ids = self.pull_author_ids()
+        if author_ids:
+            total += Post.objects.filter(author_id__in=author_ids)[
+                :settings.TIMELINE_LENGTH
+            ].count()
+        return min(total, settings.TIMELINE_LENGTH)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.posts(index.stop)[index.start or 0:]
+        return self.posts(index + 1)[index]
+
+
+class TimelinePaginator(CursorPaginator):
+    """CursorPaginator по ленте подписок вместо queryset."""
+
+    def __init__(self, timeline, per_page):
+        super().__init__(Post.objects.none(), per_page)
+        self.queryset = timeline
+
+    def after(self, moment, pk):
+        return Timeline(self.queryset.user_id, after=(moment, pk))
+
+    def before(self, moment, pk):
+        return Timeline(self.queryset.user_id, before=(moment, pk))
@@ -0,0 +1,134 @@
+import hashlib
+import os
+import tempfile
+from functools import wraps
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import (
+    FileUploadHandler, SkipFile, StopUpload,
+)
+from django.template.defaultfilters import filesizeformat
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from PIL import Image
+
+
+# Столько байт начала файла достаточно, чтобы Pillow прочитал заголовок.
+HEADER_LIMIT = 256 * 1024
+
+
+class StreamedUploadedFile(UploadedFile):
+    """Файл, записанный обработчиком прямо в каталог MEDIA_ROOT.
+
+    Хранилище ставит его на место жёсткой ссылкой, без копирования.
+    """
+
+    def __init__(self, path, name, content_type, charset, content_type_extra):
+        super().__init__(
+            open(path, "w+b"), name, content_type, 0, charset,
+            content_type_extra,
+        )
+        self.path = path
+
+    def temporary_file_path(self):
+        return self.path
+
+    def close(self):
+        try:
+            return self.file.close()
+        finally:
+            # Если хранилище не забрало файл, он больше не нужен.
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+
+class StreamingImageUploadHandler(FileUploadHandler):
+    """Пишет картинку на диск по частям и проверяет её на лету.
+
+    Загрузка больше IMAGE_UPLOAD_MAX_SIZE обрывается, как только лимит
+    превышен; картинка больше IMAGE_UPLOAD_MAX_PIXELS отбрасывается сразу
+    после заголовка. Причина попадает в request.upload_errors.
+    """
+
+    def new_file(self, field_name, file_name, content_type, content_length,
+                 charset=None, content_type_extra=None):
+        super().new_file(
+            field_name, file_name, content_type, content_length, charset,
+            content_type_extra,
+        )
+        self.header = b""
+        self.checked = False
+        self.hasher = hashlib.sha256()
+        if content_length is not None:
+            self.check_size(content_length)
+        directory = os.path.join(
+            settings.MEDIA_ROOT, settings.IMAGE_UPLOAD_TEMP_DIR
+        )
+        os.makedirs(directory, exist_ok=True)
+        fd, path = tempfile.mkstemp(suffix=".upload", dir=directory)
+        os.close(fd)
+        self.file = StreamedUploadedFile(
+            path, file_name, content_type, charset, content_type_extra
+        )
+
+    def receive_data_chunk(self, raw_data, start):
+        self.check_size(start + len(raw_data))
+        if not self.checked:
+            self.header += raw_data
+            self.check_header()
+        self.hasher.update(raw_data)
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        self.file.seek(0)
+        self.file.size = file_size
+        # ContentAddressedStorage возьмёт хеш отсюда и не будет читать файл.
+        self.file.content_hash = self.hasher.hexdigest()
+        return self.file
+
+    def check_size(self, size):
+        limit = settings.IMAGE_UPLOAD_MAX_SIZE
+        if size > limit:
+            self.reject(f"Файл больше {filesizeformat(limit)}")
+            # Остаток тела запроса не читаем.
+            raise StopUpload(connection_reset=True)
+
+    def check_header(self):
+        try:
+            width, height = Image.open(BytesIO(self.header)).size
+        except Image.DecompressionBombError:
+            width, height = None, None
+        except Exception:
+            if len(self.header) < HEADER_LIMIT:
+                return
+            # Заголовок так и не прочитан: пусть поле формы сообщит об ошибке.
+            self.checked, self.header = True, b""
+            return
+        self.checked, self.header = True, b""
+        if width is None or width * height > settings.IMAGE_UPLOAD_MAX_PIXELS:
+            self.reject("Картинка слишком большая по размерам")
+            raise SkipFile()
+
+    def reject(self, message):
+        self.request.upload_errors[self.field_name] = message
+        if hasattr(self, "file"):
+            self.file.close()
+            del self.file
+
+
+def streaming_image_upload(view):
+    """Подключает StreamingImageUploadHandler к view.
+
+    Обработчики нужно заменить до чтения request.POST, поэтому проверка CSRF
+    переносится внутрь, как советует документация Django.
+    """
+    protected = csrf_protect(view)
+
+    @csrf_exempt
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        request.upload_errors = {}
+        request.upload_handlers = [StreamingImageUploadHandler(request)]
+        return protected(request, *args, **kwargs)
+    return wrapper
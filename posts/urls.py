@@ -1,14 +1,26 @@
 from django.urls import path
 
-from . import views
+from . import feeds, views
 
 
 urlpatterns = [
     path("", views.index, name="index"),
     path("group/<slug:slug>/", views.group_posts, name="group_posts"),
+    path("feeds/<str:fmt>/", feeds.site_feed, name="site_feed"),
+    path(
+        "group/<slug:slug>/feeds/<str:fmt>/",
+        feeds.group_feed,
+        name="group_feed"
+    ),
     path("new/", views.new_post, name="new"),
     path("follow/", views.follow_index, name="follow_index"),
+    path("search/", views.search_posts, name="search"),
     path("<str:username>/", views.profile, name="profile"),
+    path(
+        "<str:username>/feeds/<str:fmt>/",
+        feeds.author_feed,
+        name="author_feed"
+    ),
     path("<str:username>/follow/", views.profile_follow, name="profile_follow"), 
     path("<str:username>/unfollow/", views.profile_unfollow, name="profile_unfollow"),
     path("<str:username>/<int:post_id>/", views.post_view, name="post"),
@@ -18,4 +30,9 @@ urlpatterns = [
             name="post_edit"
         ),
     path("<username>/<int:post_id>/comment/", views.add_comment, name="add_comment"),
+    path(
+        "<str:username>/<int:post_id>/comments/",
+        views.post_comments,
+        name="post_comments"
+    ),
 ]
@@ -1,20 +1,42 @@
+from urllib.parse import urlencode
+
 from django.shortcuts import render, get_object_or_404, redirect
 from django.core.paginator import Paginator
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
+from django.db import transaction
+from django.http import Http404
+from django.views.decorators.http import etag
 
 from posts.forms import PostForm, CommentForm
+from . import comment_writes
+from .caching import cached_count
+from .conditional import feed_condition, post_etag
+from .counters import user_stats
 from .models import Post, Group, Comment, Follow
+from .page_cache import (
+    cache_anonymous_page, group_feed, index_feed, profile_feed,
+)
+from .paginator import CursorPaginator, paginate
+from .replicas import replica_reads
+from .search import SearchResults
+from .timeline import Timeline, TimelinePaginator
+from .uploads import streaming_image_upload
 
 
 User = get_user_model()
 
+COMMENTS_PER_PAGE = 50
+
 
+@replica_reads(index_feed)
+@feed_condition(index_feed)
+@cache_anonymous_page(index_feed)
 def index(request):
-    post_list = Post.objects.order_by('-pub_date').all()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    posts = Post.objects.for_feed()
+    paginator, page = paginate(
+        request, posts, count=lambda: cached_count(index_feed(), posts)
+    )
     return render(
         request,
         "index.html",
@@ -22,12 +44,15 @@ def index(request):
     )
 
 
+@replica_reads(group_feed)
+@feed_condition(group_feed)
+@cache_anonymous_page(group_feed)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = Post.objects.filter(group=group).order_by("-pub_date")
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    page = paginator.get_page(page_number)
+    posts = Post.objects.for_feed().filter(group=group)
+    paginator, page = paginate(
+        request, posts, count=lambda: cached_count(group_feed(slug), posts)
+    )
     return render(
         request,
         "group.html",
@@ -40,9 +65,15 @@ def group_posts(request, slug):
 
 
 @login_required
+@streaming_image_upload
+@transaction.atomic
 def new_post(request):
     if request.method == "POST":
-        form = PostForm(request.POST)
+        form = PostForm(
+            request.POST,
+            files=request.FILES or None,
+            upload_errors=request.upload_errors,
+        )
 
         if form.is_valid():
             new_post_form = form.save(commit=False)
@@ -57,20 +88,23 @@ def new_post(request):
     return render(request, "new_post.html", {"form": form})
 
 
+@replica_reads(profile_feed)
+@feed_condition(profile_feed)
 def profile(request, username):
     author = get_object_or_404(User, username=username)
-    posts = author.posts.order_by('-pub_date').all()
     follow = None
     if request.user.is_authenticated:
         follow = Follow.objects.filter(user=request.user, author=author).exists()
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get("page")
-    page = paginator.get_page(page_number)
+    stats = user_stats(author)
+    paginator, page = paginate(
+        request, author.posts.for_feed(), count=lambda: stats.posts_count
+    )
     return render(
         request,
         "profile.html",
         {
             "author": author,
+            "stats": stats,
             "page": page,
             "paginator": paginator,
             "follow": follow
@@ -78,12 +112,24 @@ def profile(request, username):
     )
 
 
+def comment_page(request, comments):
+    """Комментарии от старых к новым, порциями по ключу (created, id)."""
+    paginator = CursorPaginator(
+        comments,
+        COMMENTS_PER_PAGE,
+        key=("created", "id"),
+        descending=False,
+    )
+    return paginator.get_page(after=request.GET.get("after"))
+
+
+@replica_reads()
+@etag(post_etag)
 def post_view(request, username, post_id):
     author = get_object_or_404(User, username=username)
-    posts = author.posts.order_by('-pub_date').all()
-    posts_sum = posts.count()
-    post = get_object_or_404(Post, author=author, id=post_id)
-    comments = post.comments.all()
+    stats = user_stats(author)
+    post = get_object_or_404(Post.objects.for_feed(), author=author, id=post_id)
+    comments = post.comments.select_related("author")
     form = CommentForm()
     return render(
         request,
@@ -91,25 +137,52 @@ def post_view(request, username, post_id):
         {
             "author": author,
             "post": post,
-            "posts_sum": posts_sum,
+            "stats": stats,
+            "posts_sum": stats.posts_count,
             "comments": comments,
+            "comment_page": comment_page(request, comments),
             "form": form
             }
         )
 
 
+@replica_reads()
+@etag(post_etag)
+def post_comments(request, username, post_id):
+    post = get_object_or_404(
+        Post.objects.only("id"), author__username=username, id=post_id
+    )
+    return render(
+        request,
+        "includes/comment_list.html",
+        {
+            "author": username,
+            "post": post,
+            "comment_page": comment_page(
+                request, post.comments.select_related("author")
+            ),
+        }
+    )
+
+
 @login_required
+@streaming_image_upload
 def post_edit(request, username, post_id):
     author = get_object_or_404(User, username=username)
     post = get_object_or_404(Post, author=author, id=post_id)
     user = request.user
     if user != author:
         return redirect("post", username=post.author, post_id=post.id)
-    form = PostForm(request.POST or None, files=request.FILES or None, instance=post)
+    form = PostForm(
+        request.POST or None,
+        files=request.FILES or None,
+        instance=post,
+        upload_errors=request.upload_errors,
+    )
 
     if request.method == "POST":
         if form.is_valid():
-            form.save()
+            form.save(commit=False).save(update_fields=form.Meta.fields)
             return redirect("post", username=post.author, post_id=post.id)
 
     return render(
@@ -126,36 +199,46 @@ def post_edit(request, username, post_id):
 
 @login_required
 def add_comment(request, username, post_id):
-    author = get_object_or_404(User, username=username)
-    post = get_object_or_404(Post, author=author, id=post_id)
-    if request.method == "POST":
-        form = CommentForm(request.POST)
-        if form.is_valid():
-            new_comment = form.save(commit=False)
-            new_comment.post = post
-            new_comment.author = request.user
-            new_comment.save()
-            return redirect("post", username=post.author, post_id=post.id)
+    form = CommentForm(request.POST or None)
+    if request.method == "POST" and form.is_valid():
+        # Для записи достаточно убедиться, что пост есть: один запрос по id.
+        if not Post.objects.filter(pk=post_id, author__username=username).exists():
+            raise Http404
+        try:
+            comment_writes.add(post_id, request.user.pk, form.cleaned_data["text"])
+        except comment_writes.CommentWriteError:
+            # Текст остаётся в форме, чтобы его можно было отправить снова.
+            form.add_error(
+                None, "Не удалось сохранить комментарий, попробуйте ещё раз"
+            )
+        else:
+            return redirect("post", username=username, post_id=post_id)
 
-    else:
-        form = CommentForm()
+    author = get_object_or_404(User, username=username)
+    post = get_object_or_404(Post.objects.for_feed(), author=author, id=post_id)
+    stats = user_stats(author)
     return render(
         request,
         "post_view.html",
         {
             "post": post,
             "author": author,
+            "stats": stats,
+            "posts_sum": stats.posts_count,
+            "comment_page": comment_page(
+                request, post.comments.select_related("author")
+            ),
             "form": form,
         }
     )
 
 
 @login_required
+@replica_reads()
 def follow_index(request):
-    post_list = Post.objects.filter(author__following__user=request.user).order_by("author")
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get("page")
-    page = paginator.get_page(page_number)
+    paginator, page = paginate(
+        request, Timeline(request.user.pk), cursor_paginator=TimelinePaginator
+    )
     return render(
         request,
         "follow.html",
@@ -164,6 +247,7 @@ def follow_index(request):
 
 
 @login_required
+@transaction.atomic
 def profile_follow(request, username):
     followed_author = get_object_or_404(User, username=username)
     if request.user != followed_author:
@@ -172,12 +256,29 @@ def profile_follow(request, username):
 
 
 @login_required
+@transaction.atomic
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     Follow.objects.filter(user=request.user, author=author).delete()
     return redirect('profile', username=username)
 
 
+def search_posts(request):
+    query = request.GET.get("q", "").strip()
+    paginator = Paginator(SearchResults(query), 10)
+    page = paginator.get_page(request.GET.get("page"))
+    return render(
+        request,
+        "search.html",
+        {
+            "query": query,
+            "page": page,
+            "paginator": paginator,
+            "page_query": urlencode({"q": query}),
+        }
+    )
+
+
 def page_not_found(request, exception):
     return render(
         request,
@@ -0,0 +1,187 @@
+import threading
+import time
+from collections import Counter
+
+from django.core.cache import cache
+
+
+# Границы корзин гистограммы времени получения соединения, мс.
+ACQUIRE_BUCKETS = (1, 5, 20, 100, 500)
+
+COUNTERS = ('opened', 'reused', 'health_check_failures', 'acquire_us')
+
+# Как часто, в секундах, счётчики процесса переносятся в общий кеш.
+FLUSH_INTERVAL = 10
+
+_counts = Counter()
+_counts_lock = threading.Lock()
+_flushed_at = time.monotonic()
+
+
+def metric_key(alias, name):
+    return f'db_connections:{alias}:{name}'
+
+
+def bucket_names():
+    names = [f'lt_{bound}ms' for bound in ACQUIRE_BUCKETS]
+    return names + [f'ge_{ACQUIRE_BUCKETS[-1]}ms']
+
+
+def bucket_name(elapsed_ms):
+    for bound, name in zip(ACQUIRE_BUCKETS, bucket_names()):
+        if elapsed_ms < bound:
+            return name
+    return bucket_names()[-1]
+
+
+def record(alias, name, delta=1):
+    """Копит метрику в памяти процесса; в кеш она попадает в flush().
+
+    Кеш трогается раз в FLUSH_INTERVAL секунд, а не на каждое соединение:
+    incr в FileBasedCache читает и переписывает файл, и одновременные
+    процессы теряют приращения друг друга.
+    """
+    with _counts_lock:
+        _counts[metric_key(alias, name)] += delta
+        due = time.monotonic() - _flushed_at >= FLUSH_INTERVAL
+    if due:
+        flush()
+
+
+def flush():
+    """Прибавляет накопленные процессом счётчики к общим в кеше."""
+    global _flushed_at
+    with _counts_lock:
+        pending = dict(_counts)
+        _counts.clear()
+        _flushed_at = time.monotonic()
+    for key, delta in pending.items():
+        try:
+            cache.add(key, 0, None)
+            cache.incr(key, delta)
+        except Exception:
+            # Метрики не должны ронять запрос, даже если кеш недоступен.
+            pass
+
+
+def stats(alias):
+    flush()
+    names = [*COUNTERS, *bucket_names()]
+    values = cache.get_many([metric_key(alias, name) for name in names])
+    return {name: values.get(metric_key(alias, name), 0) for name in names}
+
+
+def reset(alias):
+    keys = [metric_key(alias, name) for name in [*COUNTERS, *bucket_names()]]
+    with _counts_lock:
+        for key in keys:
+            _counts.pop(key, None)
+    cache.delete_many(keys)
+
+
+class ConnectionMetricsMixin:
+    """Повторное использование соединений с проверкой и метриками.
+
+    При CONN_HEALTH_CHECKS соединение, оставшееся с прошлого запроса,
+    проверяется перед первым использованием в новом запросе, как в
+    Django 4.1. Время получения нового соединения, вместе с ожиданием
+    пула и настройкой сессии, копится в счётчиках, см. stats().
+    """
+
+    reuse_pending = False
+
+    def close_if_unusable_or_obsolete(self):
+        super().close_if_unusable_or_obsolete()
+        self.reuse_pending = self.connection is not None
+
+    def ensure_connection(self):
+        if self.connection is not None and self.reuse_pending:
+            self.reuse_pending = False
+            if (
+                self.settings_dict.get('CONN_HEALTH_CHECKS')
+                and not self.in_atomic_block
+                and not self.is_usable()
+            ):
+                record(self.alias, 'health_check_failures')
+                self.close()
+            else:
+                record(self.alias, 'reused')
+        if self.connection is not None:
+            return
+        started = time.perf_counter()
+        super().ensure_connection()
+        elapsed = time.perf_counter() - started
+        record(self.alias, 'opened')
+        record(self.alias, 'acquire_us', int(elapsed * 1000000))
+        record(self.alias, bucket_name(elapsed * 1000))
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """Пул DB-API соединений процесса: не больше max_size выданных сразу.
+
+    connect() открывает новое соединение, reset(conn) готовит возвращённое
+    к повторной выдаче и возвращает False, если его надо закрыть.
+    Соединения, простоявшие дольше idle_timeout секунд, закрываются,
+    пока в пуле больше min_size свободных.
+    """
+
+    def __init__(self, connect, reset, min_size=0, max_size=10,
+                 idle_timeout=300, timeout=10):
+        self.connect = connect
+        self.reset = reset
+        self.min_size = min_size
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.slots = threading.BoundedSemaphore(max_size)
+        self.lock = threading.Lock()
+        # Пары (время возврата, соединение); выдаются с конца, самые тёплые.
+        self.idle = [(time.monotonic(), connect()) for _ in range(min_size)]
+
+    def get(self):
+        if not self.slots.acquire(timeout=self.timeout):
+            raise PoolTimeout(
+                f'Нет свободного соединения за {self.timeout} с'
+            )
+        try:
+            with self.lock:
+                conn = self.idle.pop()[1] if self.idle else None
+            if conn is None:
+                conn = self.connect()
+            return conn
+        except Exception:
+            self.slots.release()
+            raise
+
+    def put(self, conn):
+        try:
+            reusable = self.reset(conn)
+        except Exception:
+            reusable = False
+        try:
+            if reusable:
+                with self.lock:
+                    self.idle.append((time.monotonic(), conn))
+            else:
+                self._close(conn)
+        finally:
+            self.slots.release()
+        self.prune()
+
+    def prune(self):
+        deadline = time.monotonic() - self.idle_timeout
+        with self.lock:
+            expired = []
+            while len(self.idle) > self.min_size and self.idle[0][0] < deadline:
+                expired.append(self.idle.pop(0)[1])
+        for conn in expired:
+            self._close(conn)
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
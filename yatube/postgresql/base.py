@@ -0,0 +1,83 @@
+import os
+import threading
+
+from django.db.backends.postgresql import base
+from psycopg2 import extensions
+
+from yatube.connections import (
+    ConnectionMetricsMixin, ConnectionPool, PoolTimeout,
+)
+
+
+POOL_DEFAULTS = {
+    'MIN_SIZE': 0,
+    'MAX_SIZE': 10,
+    'IDLE_TIMEOUT': 300,
+    'TIMEOUT': 10,
+}
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def reset(conn):
+    """Откатывает незавершённую транзакцию; False — соединение не годится."""
+    if conn.closed:
+        return False
+    status = conn.get_transaction_status()
+    if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+        return False
+    if status != extensions.TRANSACTION_STATUS_IDLE:
+        conn.rollback()
+    return True
+
+
+class DatabaseWrapper(ConnectionMetricsMixin, base.DatabaseWrapper):
+    """postgresql с пулом соединений процесса, если задан ключ POOL.
+
+    POOL = {'MIN_SIZE': 2, 'MAX_SIZE': 10, 'IDLE_TIMEOUT': 300,
+    'TIMEOUT': 10}: close() возвращает соединение в пул, а следующий
+    запрос берёт его оттуда. CONN_MAX_AGE с пулом оставляют равным 0.
+    """
+
+    def pool(self, conn_params):
+        options = self.settings_dict.get('POOL')
+        if options is None:
+            return None
+        # После fork у каждого процесса-обработчика свой пул.
+        key = (self.alias, os.getpid())
+        with _pools_lock:
+            if key not in _pools:
+                options = dict(POOL_DEFAULTS, **options)
+                _pools[key] = ConnectionPool(
+                    lambda: base.Database.connect(**conn_params),
+                    reset,
+                    min_size=options['MIN_SIZE'],
+                    max_size=options['MAX_SIZE'],
+                    idle_timeout=options['IDLE_TIMEOUT'],
+                    timeout=options['TIMEOUT'],
+                )
+            return _pools[key]
+
+    def get_new_connection(self, conn_params):
+        pool = self.pool(conn_params)
+        if pool is None:
+            return super().get_new_connection(conn_params)
+        try:
+            connection = pool.get()
+        except PoolTimeout as exc:
+            raise base.Database.OperationalError(str(exc)) from exc
+        options = self.settings_dict['OPTIONS']
+        self.isolation_level = options.get(
+            'isolation_level', connection.isolation_level
+        )
+        if self.isolation_level != connection.isolation_level:
+            connection.set_session(isolation_level=self.isolation_level)
+        return connection
+
+    def _close(self):
+        pool = self.pool(self.get_connection_params())
+        if pool is None or self.connection is None:
+            return super()._close()
+        with self.wrap_database_errors:
+            pool.put(self.connection)
@@ -6,7 +6,10 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 SECRET_KEY = 'pxiol@^6jc!jtx%)#&8dz)axsy$n)#s%wb+=c=kd&%*bnxml3k'
 
-DEBUG = True
+# Production runs with YATUBE_DEBUG=False: templates then go through the
+# cached loader (see TEMPLATES below).
+
+DEBUG = os.environ.get('YATUBE_DEBUG', 'True') == 'True'
 
 ALLOWED_HOSTS = [
     'localhost',
@@ -33,10 +36,31 @@ INSTALLED_APPS = [
 ]
 
 
-CACHES = {
-    'default': {
+# YATUBE_CACHE selects the cache shared by the workers: "locmem" is
+# per-process, "file" and "redis" are shared across processes ("redis"
+# needs django-redis and any Redis-compatible server).
+
+CACHE_BACKENDS = {
+    'locmem': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get(
+            'YATUBE_CACHE_LOCATION', os.path.join(BASE_DIR, 'cache')
+        ),
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+    'redis': {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': os.environ.get(
+            'YATUBE_CACHE_LOCATION', 'redis://127.0.0.1:6379/1'
+        ),
+    },
+}
+
+CACHES = {
+    'default': CACHE_BACKENDS[os.environ.get('YATUBE_CACHE', 'locmem')],
 }
 
 
@@ -50,17 +74,29 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'posts.replicas.PrimaryStickinessMiddleware',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
 
 TEMPLATES_DIR = os.path.join(BASE_DIR, "templates")
+# Outside DEBUG templates are parsed once per process by the cached loader;
+# yatube.wsgi parses them all at startup and manage.py compile_templates
+# validates them as a build step.
+
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
-        'APP_DIRS': True,
         'OPTIONS': {
+            'loaders': TEMPLATE_LOADERS if DEBUG else [
+                ('django.template.loaders.cached.Loader', TEMPLATE_LOADERS),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -77,13 +113,45 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# yatube.sqlite applies PRAGMAS (WAL, busy_timeout, mmap...) to every new
+# connection; see yatube.sqlite.base for the defaults. Connections are kept
+# for CONN_MAX_AGE seconds and checked before reuse (CONN_HEALTH_CHECKS).
+# For Postgres use 'ENGINE': 'yatube.postgresql' with 'CONN_MAX_AGE': 0 and
+# 'POOL': {'MIN_SIZE': 2, 'MAX_SIZE': 10, 'IDLE_TIMEOUT': 300, 'TIMEOUT': 10}
+# for a per-process pool. Acquisition metrics: manage.py db_connection_stats.
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'yatube.sqlite',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': 60,
+        'CONN_HEALTH_CHECKS': True,
+        'TRANSACTION_MODE': 'IMMEDIATE',
+        'PRAGMAS': {
+            'busy_timeout': 5000,
+        },
     }
 }
 
+# Read replicas, see posts.replicas: aliases of DATABASES that serve the reads
+# of GET feed and profile pages. YATUBE_REPLICAS lists SQLite files kept as
+# copies of db.sqlite3, e.g. YATUBE_REPLICAS=/srv/replica1.sqlite3; a client
+# reads from the primary for REPLICA_STICKY_SECONDS after each write.
+
+DATABASE_REPLICAS = []
+
+for number, name in enumerate(
+    filter(None, os.environ.get('YATUBE_REPLICAS', '').split(','))
+):
+    DATABASES[f'replica{number}'] = dict(
+        DATABASES['default'], NAME=name, TEST={'MIRROR': 'default'}
+    )
+    DATABASE_REPLICAS.append(f'replica{number}')
+
+DATABASE_ROUTERS = ['posts.replicas.ReplicaRouter']
+
+REPLICA_STICKY_SECONDS = 5
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -138,3 +206,75 @@ LOGOUT_REDIRECT_URL = "index"
 EMAIL_BACKEND = "django.core.mail.backends.filebased.EmailBackend"
 
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, "/sent_emails")
+
+
+# Follow timeline: posts are pushed into followers' timelines on write
+# unless the author has more followers than TIMELINE_FANOUT_LIMIT, in
+# which case their posts are pulled into the feed on read instead. An
+# author who once crossed the limit stays pulled, see posts.timeline.
+
+TIMELINE_FANOUT_LIMIT = 1000
+
+TIMELINE_LENGTH = 500
+
+# Rendered post cards are cached per post version, see posts.cards.
+
+POST_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Anonymous index/group pages, invalidated on change, see posts.page_cache.
+
+PAGE_CACHE_TIMEOUT = 60 * 10
+
+# Feed generations expire too, so probing random group slugs does not leave
+# keys behind forever; keep it above PAGE_CACHE_TIMEOUT and FEED_COUNT_TIMEOUT.
+
+PAGE_CACHE_GENERATION_TIMEOUT = 60 * 60
+
+# Feed totals for the numbered paginator, keyed by the feed generation
+# of posts.page_cache and recomputed through posts.caching.get_or_set.
+
+FEED_COUNT_TIMEOUT = 60 * 10
+
+# Thumbnails are prepared by a thread pool after the upload is committed,
+# see posts.thumbnails; set THUMBNAIL_ASYNC to False to prepare them inline.
+
+THUMBNAIL_ASYNC = True
+
+THUMBNAIL_WORKERS = 2
+
+# Post images are streamed into MEDIA_ROOT/IMAGE_UPLOAD_TEMP_DIR and checked
+# against these limits while the upload is still arriving, see posts.uploads.
+
+IMAGE_UPLOAD_MAX_SIZE = 5 * 1024 * 1024
+
+IMAGE_UPLOAD_MAX_PIXELS = 40 * 1000 * 1000
+
+IMAGE_UPLOAD_TEMP_DIR = 'uploads'
+
+# Streamed files are created with mode 0600 and moved into place as is.
+
+FILE_UPLOAD_PERMISSIONS = 0o644
+
+# Media and static files are served by posts.serving. Set SENDFILE_BACKEND
+# to 'x-accel-redirect' (nginx, with SENDFILE_INTERNAL_URL mapped to an
+# internal location) or 'x-sendfile' (Apache, lighttpd) to hand the transfer
+# over to the front server.
+
+SENDFILE_BACKEND = None
+
+SENDFILE_INTERNAL_URL = '/internal/'
+
+MEDIA_CACHE_MAX_AGE = 60 * 60 * 24 * 365
+
+# Comment writes, see posts.comment_writes: 'direct' inserts in the request,
+# 'durable' coalesces inserts into bulk_create batches of a background writer
+# and answers after the batch is committed, 'buffered' answers at once and
+# may lose the queued comments if the process dies.
+
+COMMENT_WRITE_MODE = 'direct'
+
+COMMENT_BATCH_WINDOW = 0.02
+
+COMMENT_BATCH_SIZE = 200
+
+COMMENT_WRITE_TIMEOUT = 5
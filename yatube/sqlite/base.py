@@ -0,0 +1,47 @@
+from django.db.backends.sqlite3 import base
+
+from yatube.connections import ConnectionMetricsMixin
+
+
+# Значения по умолчанию; переопределяются ключом PRAGMAS в DATABASES.
+PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'cache_size': -64000,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+# Для базы в памяти эти настройки не имеют смысла.
+FILE_ONLY_PRAGMAS = {'journal_mode', 'mmap_size'}
+
+
+class DatabaseWrapper(ConnectionMetricsMixin, base.DatabaseWrapper):
+    """sqlite3 с PRAGMA на каждом новом соединении.
+
+    TRANSACTION_MODE = 'IMMEDIATE' открывает транзакции atomic() командой
+    BEGIN IMMEDIATE: блокировка записи берётся сразу и ждёт busy_timeout,
+    а не падает с «database is locked» при попытке начать запись
+    посреди уже открытой транзакции чтения.
+    """
+
+    def pragmas(self):
+        pragmas = dict(PRAGMAS, **self.settings_dict.get('PRAGMAS', {}))
+        if self.is_in_memory_db():
+            for name in FILE_ONLY_PRAGMAS:
+                pragmas.pop(name, None)
+        return pragmas
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas().items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        mode = self.settings_dict.get('TRANSACTION_MODE')
+        if mode:
+            self.cursor().execute(f'BEGIN {mode}')
+        else:
+            super()._start_transaction_under_autocommit()
@@ -2,8 +2,8 @@ from django.contrib import admin
 from django.urls import include, path
 from django.contrib.flatpages import views
 from django.conf.urls import handler404, handler500
-from django.conf import settings
-from django.conf.urls.static import static
+
+from posts import serving
 
 
 handler404 = "posts.views.page_not_found"  # noqa
@@ -16,14 +16,13 @@ urlpatterns = [
     path('about-spec/', views.flatpage, {'url': '/about-spec/'}, name='spec'),
 ]
 
+urlpatterns += serving.urlpatterns()
+
 urlpatterns += [
+    path('api/v1/', include('posts.api_urls')),
     path('', include('posts.urls')),
     path('auth/', include('users.urls')),
     path('auth/', include('django.contrib.auth.urls')),
     path('site/admin/', admin.site.urls),
     path('about/', include('django.contrib.flatpages.urls')),
 ]
-
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
-    urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)